@@ -0,0 +1,66 @@
+"""Time finding which cached images are on disk: a stat per image versus one listing."""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from get_image import (  # noqa: E402
+    NameAllocator,
+    PlannedCache,
+    filename_from_title,
+    iter_plan,
+    scan_assets,
+)
+from image_store import ImageStore  # noqa: E402
+from poster import Poster  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=50_000)
+    parser.add_argument(
+        "--dir", type=Path, help="directory to create the files in (default: a temp dir)"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        assets = Path(tmp) / "assets"
+        assets.mkdir()
+        posters = [
+            Poster(f"Poster {i}", "", "", [f"https://i/{i}.png"]) for i in range(args.files)
+        ]
+        with ImageStore(Path(tmp) / "images.db") as store:
+            for poster in posters:
+                url = poster.images[0]
+                filename = "".join(filename_from_title(poster.title, url, 0, 1))
+                (assets / filename).touch()
+                store.put(filename, url)
+            store.commit()
+            names = list(store)
+
+            started = time.perf_counter()
+            present = {name for name in names if (assets / name).exists()}
+            print(f"{len(names)} exists() calls: {time.perf_counter() - started:.3f}s")
+
+            started = time.perf_counter()
+            assert scan_assets(assets) == present
+            print(f"scan_assets(): {time.perf_counter() - started:.3f}s")
+
+            started = time.perf_counter()
+            allocator = NameAllocator(store, PlannedCache(store))
+            kinds = Counter(
+                action.kind
+                for action in iter_plan(posters, store, allocator, scan_assets(assets))
+            )
+            print(f"no-op plan: {time.perf_counter() - started:.3f}s {dict(kinds)}")
+
+
+if __name__ == "__main__":
+    main()
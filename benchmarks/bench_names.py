@@ -0,0 +1,86 @@
+"""Time naming 2000 new URLs for a title that already has 5000 collisions."""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from collections.abc import Mapping
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from get_image import NameAllocator, slot_name  # noqa: E402
+from image_store import ImageStore  # noqa: E402
+
+
+def choose_filename(
+    base: str, ext: str, url: str, image_cache: Mapping[str, str], reserved: set[str]
+) -> str:
+    """The linear scan NameAllocator replaced."""
+    candidate = f"{base}{ext}"
+    counter = 2
+
+    while True:
+        conflict_cache = candidate in image_cache and image_cache[candidate] != url
+        conflict_reserved = candidate in reserved and candidate not in image_cache
+
+        if conflict_cache or conflict_reserved:
+            candidate = f"{base}_{counter}{ext}"
+            counter += 1
+            continue
+
+        return candidate
+
+
+def scan(image_cache: Mapping[str, str], count: int) -> float:
+    reserved: set[str] = set()
+    started = time.perf_counter()
+    for i in range(count):
+        reserved.add(choose_filename("Title", ".png", f"https://new/{i}", image_cache, reserved))
+    return time.perf_counter() - started
+
+
+def allocate(names: NameAllocator, count: int) -> float:
+    started = time.perf_counter()
+    for i in range(count):
+        names.reserve(names.choose("Title", ".png", f"https://new/{i}"))
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--collisions", type=int, default=5000)
+    parser.add_argument("--names", type=int, default=2000)
+    parser.add_argument(
+        "--store-scan",
+        type=int,
+        default=200,
+        help="names to time the linear scan for on the SQLite store (default: 200)",
+    )
+    args = parser.parse_args()
+
+    taken = {
+        slot_name("Title", ".png", slot): f"https://old/{slot}"
+        for slot in range(1, args.collisions + 1)
+    }
+    print(f"linear scan, dict: {scan(taken, args.names):.3f}s for {args.names} names")
+
+    with tempfile.TemporaryDirectory() as tmp, ImageStore(Path(tmp) / "images.db") as store:
+        for filename, url in taken.items():
+            store.put(filename, url)
+        store.commit()
+        elapsed = scan(store, args.store_scan)
+        print(f"linear scan, store: {elapsed:.3f}s for {args.store_scan} names")
+
+        names = NameAllocator(store)
+        print(f"allocator, cold: {allocate(names, args.names):.3f}s for {args.names} names")
+        # Nothing was downloaded, so saving leaves the cursor at the first free slot.
+        names.save()
+        names = NameAllocator(store)
+        print(f"allocator, saved cursor: {allocate(names, args.names):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
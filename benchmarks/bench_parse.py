@@ -0,0 +1,68 @@
+"""Time extract_posters on a synthetic page, inline and with a pool of chapter workers."""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from get_meta import extract_posters, split_chapters  # noqa: E402
+
+
+def page(templates: int, chapters: int = 8, years: int = 6, seed: int = 1) -> str:
+    """A page of `chapters` level-2 sections with `years` level-3 sections each."""
+    rng = random.Random(seed)
+    descriptions = ["明日方舟新活动宣传图", "a{{=}}b 描述", "第一行\n第二行", ""]
+    out = []
+    i = 0
+    for chapter in range(chapters):
+        out.append(f"== 分类{chapter} ==\n")
+        for year in range(years):
+            out.append(f"=== {2019 + year} ===\n")
+            for _ in range(templates // (chapters * years)):
+                i += 1
+                images = "|".join(
+                    f"https://media.prts.wiki/{i}/{k}.png" for k in range(rng.randint(1, 4))
+                )
+                desc = rng.choice(descriptions)
+                out.append(
+                    "{{微博|[https://weibo.com/7461423907/%d 宣传图%d]|%s|%s}}\n"
+                    % (i, i, desc, images)
+                )
+    return "".join(out)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--templates", type=int, default=100_000)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4],
+        help="worker counts to time (default: 1 2 4)",
+    )
+    args = parser.parse_args()
+
+    text = page(args.templates)
+    print(
+        f"{len(text.encode()) / 2**20:.1f} MiB, {len(split_chapters(text))} chapters, "
+        f"{os.cpu_count()} CPUs"
+    )
+    expected = None
+    for workers in args.workers:
+        started = time.perf_counter()
+        posters = extract_posters(text, workers)
+        elapsed = time.perf_counter() - started
+        expected = expected or posters
+        same = "same" if posters == expected else "DIFFERENT"
+        print(f"workers={workers}: {len(posters)} posters in {elapsed:.2f}s ({same})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Time the meta cache with every installed JSON backend and both cache formats."""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import serializer  # noqa: E402
+from meta_cache import iter_posters, load_meta, save_meta  # noqa: E402
+from poster import Poster  # noqa: E402
+
+
+def meta(count: int) -> tuple[list[Poster], dict[str, Any]]:
+    """`count` posters with two resolved images each."""
+    posters = []
+    files: dict[str, Any] = {}
+    for i in range(count):
+        images = [f"Poster_{i}_{k}.png" for k in range(2)]
+        posters.append(
+            Poster(
+                f"宣传图{i}",
+                f"https://weibo.com/7461423907/{i}",
+                "明日方舟新活动宣传图\n第二行",
+                images,
+                f"分类{i % 8}",
+                str(2019 + i % 6),
+            )
+        )
+        for image in images:
+            files[image] = {
+                "url": f"https://media.prts.wiki/{i}/{image}",
+                "size": 123456,
+                "width": 1920,
+                "height": 1080,
+                "sha1": "0" * 40,
+                "mime": "image/png",
+            }
+    return posters, files
+
+
+def best(repeat: int, run: Callable[[], object]) -> float:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posters", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many (default: 3)")
+    args = parser.parse_args()
+
+    posters, files = meta(args.posters)
+    header = {"revid": 1}
+    cwd = Path.cwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # The meta cache lives at a path relative to the working directory.
+        os.chdir(tmp)
+        for backend in serializer.available_backends():
+            serializer.set_backend(backend)
+            for fmt, pretty in (("json", True), ("json", False), ("jsonl", False)):
+                path = save_meta(header, posters, files, fmt, pretty)
+                name = f"{backend} {fmt}{' pretty' if pretty else ''}"
+                save = best(args.repeat, lambda: save_meta(header, posters, files, fmt, pretty))
+                size = path.stat().st_size / 2**20
+                read = best(args.repeat, lambda: sum(1 for _ in iter_posters(path)))
+                load = best(args.repeat, lambda: load_meta(path))
+                print(
+                    f"{name:20} save {save:5.2f}s {size:6.1f} MiB  "
+                    f"iter_posters {read:5.2f}s  load_meta {load:5.2f}s"
+                )
+        os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
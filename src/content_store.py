@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import errno
+import os
+import shutil
+from pathlib import Path
+
+
+STORE_DIR = Path("store")
+LINK_MODES = ("hardlink", "symlink")
+
+
+def object_path(sha256: str, ext: str, store_dir: Path = STORE_DIR) -> Path:
+    """Location of the blob with the given digest, fanned out by its first two hex digits."""
+    return store_dir / sha256[:2] / f"{sha256}{ext}"
+
+
+def link_view(blob: Path, view: Path, mode: str) -> None:
+    """Point the human-readable `view` at `blob`, by symlink if a hardlink fails."""
+    view.unlink(missing_ok=True)
+    if mode == "hardlink":
+        try:
+            os.link(blob, view)
+            return
+        except OSError:
+            pass
+    view.symlink_to(os.path.relpath(blob, view.parent))
+
+
+def adopt(path: Path, sha256: str, mode: str, store_dir: Path = STORE_DIR) -> bool:
+    """Move a download into the store, leaving a link; True if it was already stored."""
+    blob = object_path(sha256, path.suffix, store_dir)
+    duplicate = blob.exists()
+    if not duplicate:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            path.replace(blob)
+        except OSError as exc:
+            if exc.errno != errno.EXDEV:
+                raise
+            temp = blob.with_name(blob.name + ".tmp")
+            shutil.copyfile(path, temp)
+            temp.replace(blob)
+            path.unlink()
+    link_view(blob, path, mode)
+    return duplicate
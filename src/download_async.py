@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from functools import partial
+from pathlib import Path
+
+from throttle import HostThrottle, Slot
+from transfer import Download, RangeWriter
+from transfer_watchdog import Transfer, TransferWatchdog
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - optional dependency
+    aiohttp = None
+
+
+CHUNK_SIZE = 65536
+
+
+class AsyncDownloader:
+    """Download images over one pooled aiohttp session running on a private event loop."""
+
+    def __init__(
+        self,
+        concurrency: int,
+        per_host: int | None = None,
+        headers: dict[str, str] | None = None,
+        timeout: float = 30,
+        segments: int = 1,
+        segment_threshold: int = 8 * 1024 * 1024,
+        throttle: HostThrottle | None = None,
+        watchdog: TransferWatchdog | None = None,
+    ) -> None:
+        if aiohttp is None:
+            raise RuntimeError("The aiohttp backend requires `pip install aiohttp`.")
+        self.concurrency = concurrency
+        self.per_host = per_host or concurrency
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.segments = segments
+        self.segment_threshold = segment_threshold
+        self.throttle = throttle or HostThrottle()
+        self.watchdog = watchdog or TransferWatchdog(min_rate=0)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._session: aiohttp.ClientSession | None = None
+        self._slots: asyncio.Semaphore | None = None
+
+    def __enter__(self) -> AsyncDownloader:
+        self.watchdog.__enter__()
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._open(), self._loop).result()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        asyncio.run_coroutine_threadsafe(self._close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self.watchdog.__exit__()
+
+    async def _open(self) -> None:
+        # Each download may hold up to `segments` connections at once; the
+        # semaphore bounds downloads so segments never starve on the connector.
+        self._slots = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency * self.segments,
+            limit_per_host=self.per_host * self.segments,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(sock_connect=self.timeout, sock_read=self.timeout),
+        )
+
+    async def _close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+        await self._loop.shutdown_default_executor()
+
+    def submit(
+        self,
+        url: str,
+        destination: Path,
+        label: str | None = None,
+        validators: dict[str, str] | None = None,
+    ) -> Future[dict[str, str] | None]:
+        return asyncio.run_coroutine_threadsafe(
+            self._download(url, destination, label, validators), self._loop
+        )
+
+    def _watch(self, resp: aiohttp.ClientResponse) -> Transfer:
+        """Watch the body of `resp`; the watchdog thread aborts it on the event loop."""
+        return self.watchdog.watch(partial(self._loop.call_soon_threadsafe, resp.close))
+
+    async def _download(
+        self,
+        url: str,
+        destination: Path,
+        label: str | None,
+        validators: dict[str, str] | None,
+    ) -> dict[str, str] | None:
+        assert self._slots is not None
+        async with self._slots:
+            return await self._fetch(url, destination, label, validators)
+
+    async def _fetch(
+        self,
+        url: str,
+        destination: Path,
+        label: str | None,
+        validators: dict[str, str] | None,
+    ) -> dict[str, str] | None:
+        assert self._session is not None
+        download = Download(
+            url,
+            destination,
+            self.throttle,
+            label,
+            validators,
+            self.segments,
+            self.segment_threshold,
+        )
+        # Hashing whole files would stall every transfer on the loop.
+        loop = asyncio.get_running_loop()
+
+        for attempt in download.attempts():
+            headers = download.request_headers()
+            slot = self.throttle.slot(url)
+            try:
+                async with slot, self._session.get(url, headers=headers) as resp:
+                    slot.responded(resp.status, resp.headers)
+                    if resp.status == 304:
+                        return None
+                    resp.raise_for_status()
+                    digest = None
+                    if download.accept(resp.status, resp.headers):
+                        await self._download_segmented(resp, slot, download)
+                    else:
+                        body = await loop.run_in_executor(None, download.open_body)
+                        with body, self._watch(resp) as transfer:
+                            async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                                body.write(chunk)
+                                transfer.progress(len(chunk))
+                                with transfer.pause():
+                                    await slot.consume_async(len(chunk))
+                        digest = body.digest
+                return await loop.run_in_executor(None, download.complete, digest)
+            except Exception as exc:  # noqa: BLE001
+                delay = download.retry_delay(exc, slot, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    async def _download_segmented(
+        self, first: aiohttp.ClientResponse, first_slot: Slot, download: Download
+    ) -> None:
+        """Fill the `.part` from concurrent byte ranges, the first of them read from `first`."""
+        assert self._session is not None
+        bounds = download.segment_bounds()
+
+        async def fetch(start: int, end: int) -> None:
+            headers = download.segment_headers(start, end)
+            slot = self.throttle.slot(download.url, hold=False)
+            async with slot, self._session.get(download.url, headers=headers) as resp:
+                slot.responded(resp.status, resp.headers)
+                resp.raise_for_status()
+                download.check_segment(resp.status, resp.headers, start)
+                with self._watch(resp) as transfer:
+                    writer = RangeWriter(download.temp_path, start, end)
+                    await write_range(writer, resp, slot, transfer)
+
+        tasks = [asyncio.ensure_future(fetch(start, end)) for start, end in bounds[1:]]
+
+        async def fetch_first() -> None:
+            with self._watch(first) as transfer:
+                writer = RangeWriter(download.temp_path, *bounds[0])
+                await write_range(writer, first, first_slot, transfer)
+
+        tasks.append(asyncio.ensure_future(fetch_first()))
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+
+async def write_range(
+    writer: RangeWriter, resp: aiohttp.ClientResponse, slot: Slot, transfer: Transfer
+) -> None:
+    """Write the body of `resp` into its byte range of a preallocated file."""
+    with writer:
+        async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+            written = writer.write(chunk)
+            transfer.progress(written)
+            with transfer.pause():
+                await slot.consume_async(written)
+            if not writer.remaining:
+                break
+    writer.check()
@@ -1,27 +1,24 @@
 from __future__ import annotations
 
-import json
+import argparse
 from collections import Counter
+from collections.abc import Iterable
 from pathlib import Path
 
+import serializer
+from meta_cache import find_meta, iter_posters
+from poster import Poster
+
 
-META_CACHE_PATH = Path("cache/meta_cache.json")
 CATEGORY_CACHE_PATH = Path("cache/category_cache.json")
 FALLBACK_CATEGORY = "Uncategorized"
 
 
-def load_meta(path: Path) -> dict:
-    if not path.exists():
-        raise FileNotFoundError(f"Meta cache not found: {path}")
-    return json.loads(path.read_text(encoding="utf-8"))
-
-
-def summarize_categories(meta: dict) -> list[dict[str, object]]:
-    posters = meta.get("posters", [])
+def summarize_categories(posters: Iterable[Poster]) -> list[dict[str, object]]:
     counter: Counter[str] = Counter()
 
     for poster in posters:
-        category = (poster.get("category") or FALLBACK_CATEGORY).strip()
+        category = (poster.category or FALLBACK_CATEGORY).strip()
         counter[category] += 1
 
     summary = [
@@ -31,27 +28,49 @@ def summarize_categories(meta: dict) -> list[dict[str, object]]:
     return summary
 
 
-def save_summary(path: Path, summary: list[dict[str, object]], total: int) -> None:
+def save_summary(
+    path: Path,
+    summary: list[dict[str, object]],
+    total: int,
+    source: Path,
+    pretty: bool = False,
+) -> None:
     payload = {
-        "source": str(META_CACHE_PATH),
+        "source": str(source),
         "total_items": total,
         "total_categories": len(summary),
         "categories": summary,
     }
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    serializer.write_file(path, payload, pretty)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Count the posters in each category.")
+    parser.add_argument(
+        "--pretty",
+        action="store_true",
+        help="indent the category cache for reading; it is compact by default",
+    )
+    return parser.parse_args(argv)
 
 
-def main() -> None:
-    meta = load_meta(META_CACHE_PATH)
-    summary = summarize_categories(meta)
-    total_items = len(meta.get("posters", []))
-    save_summary(CATEGORY_CACHE_PATH, summary, total_items)
+def update_categories(posters: Iterable[Poster], source: Path, pretty: bool = False) -> None:
+    """Write the category summary of `posters`, which were read from `source`."""
+    summary = summarize_categories(posters)
+    total_items = sum(int(item["count"]) for item in summary)
+    save_summary(CATEGORY_CACHE_PATH, summary, total_items, source, pretty)
     print(
         f"Wrote {len(summary)} categories "
         f"covering {total_items} items to {CATEGORY_CACHE_PATH}"
     )
 
 
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    meta_path = find_meta()
+    update_categories(iter_posters(meta_path), meta_path, args.pretty)
+
+
 if __name__ == "__main__":
     main()
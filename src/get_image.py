@@ -1,35 +1,86 @@
 from __future__ import annotations
 
-import json
+import argparse
+import os
+import queue
 import re
+import socket
+import time
+from collections import Counter
+from collections.abc import Iterable, Iterator, Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from urllib.parse import urlparse
+from typing import Any
+from urllib.parse import unquote, urlparse
 
 import requests
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 
-
-META_CACHE_PATH = Path("cache/meta_cache.json")
+import serializer
+from content_store import LINK_MODES, STORE_DIR, adopt
+from image_store import ImageStore
+from meta_cache import find_meta, iter_posters
+from poster import Poster
+from throttle import HostThrottle, HostUnavailable, Slot
+from transfer import Download, RangeWriter, file_digest
+from transfer_watchdog import (
+    DEFAULT_MIN_RATE,
+    DEFAULT_WINDOW,
+    SlowTransfer,
+    TransferWatchdog,
+)
+
+
+IMAGE_DB_PATH = Path("cache/images.db")
+# Legacy JSON caches, imported into IMAGE_DB_PATH once.
 IMAGE_CACHE_PATH = Path("cache/image_cache.json")
+IMAGE_HEADERS_PATH = Path("cache/image_headers.json")
+INTEGRITY_PATH = Path("cache/integrity.json")
 ASSETS_DIR = Path("assets")
-
-
-def load_json(path: Path) -> dict[str, str]:
+DEFAULT_WORKERS = 8
+# Adaptive concurrency starts here and grows towards --workers.
+ADAPTIVE_START = 4
+DEFAULT_SEGMENT_THRESHOLD = 8 * 1024 * 1024
+CHUNK_SIZE = 65536
+# A URL that is slow or whose host keeps failing goes to the end of the run this often.
+MAX_DEFERRALS = 3
+BACKENDS = ("threads", "aiohttp")
+USER_AGENT = "arknights-poster-updater/1.0"
+
+
+def load_json(path: Path) -> dict[str, Any]:
     """Load JSON from disk, returning an empty dict on missing/blank/invalid files."""
     if not path.exists():
         return {}
-    content = path.read_text(encoding="utf-8")
+    content = path.read_bytes()
     if not content.strip():
         return {}
     try:
-        return json.loads(content)
-    except json.JSONDecodeError:
+        return serializer.loads(content)
+    except serializer.FormatError:
         return {}
 
 
-def save_json(path: Path, payload: dict[str, str]) -> None:
-    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+def open_image_store(dry_run: bool = False) -> ImageStore:
+    """Open the SQLite image store, importing the legacy JSON caches on first use."""
+    created = not IMAGE_DB_PATH.exists()
+    if created and dry_run:
+        store = ImageStore(Path(":memory:"))
+        store.import_json(
+            load_json(IMAGE_CACHE_PATH), load_json(IMAGE_HEADERS_PATH), load_json(INTEGRITY_PATH)
+        )
+        return store
+    store = ImageStore(IMAGE_DB_PATH)
+    if created and IMAGE_CACHE_PATH.exists():
+        store.import_json(
+            load_json(IMAGE_CACHE_PATH), load_json(IMAGE_HEADERS_PATH), load_json(INTEGRITY_PATH)
+        )
+        for path in (IMAGE_CACHE_PATH, IMAGE_HEADERS_PATH, INTEGRITY_PATH):
+            if path.exists():
+                path.rename(path.with_name(path.name + ".migrated"))
+        print(f"Migrated {len(store)} entries from {IMAGE_CACHE_PATH} to {IMAGE_DB_PATH}")
+    return store
 
 
 def sanitize_title(title: str) -> str:
@@ -40,6 +91,20 @@ def sanitize_title(title: str) -> str:
     return cleaned.strip("_") or "image"
 
 
+def resolve_image(
+    value: str, files: Mapping[str, Mapping[str, Any]]
+) -> tuple[str, Mapping[str, Any] | None]:
+    """Return the URL to fetch for an image parameter and the wiki's record of it."""
+    info = files.get(value)
+    if info is None:
+        return value, None
+    if "://" not in value:
+        return info["url"], info
+    if unquote(value) == unquote(info["url"]):
+        return value, info
+    return value, None
+
+
 def filename_from_title(title: str, url: str, index: int, total: int) -> tuple[str, str]:
     """Return (base_name, extension)."""
     parsed = urlparse(url)
@@ -54,150 +119,785 @@ def filename_from_title(title: str, url: str, index: int, total: int) -> tuple[s
     return base_title, ext
 
 
-def build_session() -> requests.Session:
+def build_session(pool_size: int = DEFAULT_WORKERS) -> requests.Session:
+    """Create a session whose connection pool fits `pool_size` workers."""
     session = requests.Session()
-    retry = Retry(
-        total=5,
-        backoff_factor=1,
-        status_forcelist=(429, 500, 502, 503, 504),
-        allowed_methods={"GET"},
-    )
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
-    session.headers.update({"User-Agent": "arknights-poster-updater/1.0"})
+    session.headers.update({"User-Agent": USER_AGENT})
     return session
 
 
+def abort_response(resp: requests.Response) -> None:
+    """Shut down the socket under a streaming response so a blocked read returns."""
+    sock = getattr(getattr(resp.raw, "_connection", None), "sock", None)
+    if sock is not None:
+        sock.shutdown(socket.SHUT_RDWR)
+
+
+def write_range(
+    writer: RangeWriter,
+    resp: requests.Response,
+    slot: Slot,
+    watchdog: TransferWatchdog,
+) -> None:
+    """Write the body of `resp` into its byte range of a preallocated file."""
+    with watchdog.watch(lambda: abort_response(resp)) as transfer, writer:
+        for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+            written = writer.write(chunk)
+            transfer.progress(written)
+            with transfer.pause():
+                slot.consume(written)
+            if not writer.remaining:
+                break
+    writer.check()
+
+
+def download_segmented(
+    first: requests.Response,
+    first_slot: Slot,
+    download: Download,
+    session: requests.Session,
+    watchdog: TransferWatchdog,
+) -> None:
+    """Fill the `.part` from concurrent byte ranges, the first of them read from `first`."""
+    bounds = download.segment_bounds()
+
+    def fetch(start: int, end: int) -> None:
+        headers = download.segment_headers(start, end)
+        with download.throttle.slot(download.url, hold=False) as slot:
+            with session.get(download.url, timeout=30, stream=True, headers=headers) as resp:
+                slot.responded(resp.status_code, resp.headers)
+                resp.raise_for_status()
+                download.check_segment(resp.status_code, resp.headers, start)
+                write_range(RangeWriter(download.temp_path, start, end), resp, slot, watchdog)
+
+    with ThreadPoolExecutor(max_workers=len(bounds) - 1 or 1) as pool:
+        futures = [pool.submit(fetch, start, end) for start, end in bounds[1:]]
+        write_range(RangeWriter(download.temp_path, *bounds[0]), first, first_slot, watchdog)
+        for future in futures:
+            future.result()
+
+
 def download_image(
     url: str,
     destination: Path,
     session: requests.Session,
-    retries: int = 3,
     label: str | None = None,
-) -> None:
-    temp_path = destination.with_suffix(destination.suffix + ".part")
-    label_text = f" ({label})" if label else ""
+    validators: dict[str, str] | None = None,
+    segments: int = 1,
+    segment_threshold: int = DEFAULT_SEGMENT_THRESHOLD,
+    throttle: HostThrottle | None = None,
+    watchdog: TransferWatchdog | None = None,
+) -> dict[str, str] | None:
+    """Download `url` with requests; see transfer.Download. None if it was not modified."""
+    throttle = throttle or HostThrottle()
+    download = Download(
+        url, destination, throttle, label, validators, segments, segment_threshold
+    )
+    watchdog = watchdog or TransferWatchdog(min_rate=0)
 
-    for attempt in range(1, retries + 1):
+    for attempt in download.attempts():
+        headers = download.request_headers()
+        slot = throttle.slot(url)
         try:
-            with session.get(url, timeout=30, stream=True) as resp:
+            with slot, session.get(url, timeout=30, stream=True, headers=headers) as resp:
+                slot.responded(resp.status_code, resp.headers)
+                if resp.status_code == 304:
+                    return None
                 resp.raise_for_status()
-                with temp_path.open("wb") as file:
-                    for chunk in resp.iter_content(chunk_size=65536):
-                        if chunk:
-                            file.write(chunk)
-            temp_path.replace(destination)
-            return
+                digest = None
+                if download.accept(resp.status_code, resp.headers):
+                    download_segmented(resp, slot, download, session, watchdog)
+                else:
+                    body = download.open_body()
+                    with body, watchdog.watch(lambda: abort_response(resp)) as transfer:
+                        for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                            if chunk:
+                                body.write(chunk)
+                                transfer.progress(len(chunk))
+                                with transfer.pause():
+                                    slot.consume(len(chunk))
+                    digest = body.digest
+            return download.complete(digest)
         except Exception as exc:  # noqa: BLE001
-            temp_path.unlink(missing_ok=True)
-            if attempt == retries:
+            delay = download.retry_delay(exc, slot, attempt)
+            if delay is None:
                 raise
-            print(f"Retry {attempt}/{retries} for {url}{label_text} after error: {exc}")
+            time.sleep(delay)
 
 
-def choose_filename(
-    base: str, ext: str, url: str, image_cache: dict[str, str], reserved: set[str]
-) -> str:
-    """
-    Pick a deterministic filename, avoiding collisions with other URLs.
+def scan_assets(directory: Path) -> set[str]:
+    """Names of the files in `directory`, from a single directory listing."""
+    with os.scandir(directory) as entries:
+        return {entry.name for entry in entries if entry.is_file()}
 
-    - If a filename already maps to the same URL, reuse it.
-    - If the filename is used by another URL or reserved in this run, append counters.
-    """
-    candidate = f"{base}{ext}"
-    counter = 2
 
-    while True:
-        conflict_cache = candidate in image_cache and image_cache[candidate] != url
-        conflict_reserved = candidate in reserved and candidate not in image_cache
+def slot_name(base: str, ext: str, slot: int) -> str:
+    """Filename for collision slot `slot`: `{base}{ext}`, then `{base}_2{ext}`, ..."""
+    return f"{base}{ext}" if slot == 1 else f"{base}_{slot}{ext}"
+
+
+def name_slots(name: str) -> list[tuple[tuple[str, str], int]]:
+    """Every ((base, ext), slot) that could have produced `name`."""
+    path = Path(name)
+    stem, ext = path.stem, path.suffix
+    slots = [((stem, ext), 1)]
+    match = re.fullmatch(r"(.+)_(\d+)", stem)
+    if match and int(match.group(2)) >= 2:
+        slots.append(((match.group(1), ext), int(match.group(2))))
+    return slots
+
+
+class PlannedCache(Mapping[str, str]):
+    """In-memory `filename -> url` view of the image store for planning a run."""
+
+    def __init__(self, store: ImageStore) -> None:
+        self._names = store.snapshot()
+        self._urls = {url: filename for filename, url in self._names.items()}
+
+    def __getitem__(self, filename: str) -> str:
+        return self._names[filename]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
 
-        if conflict_cache or conflict_reserved:
-            candidate = f"{base}_{counter}{ext}"
-            counter += 1
-            continue
+    def __len__(self) -> int:
+        return len(self._names)
 
-        return candidate
+    def filename_for(self, url: str) -> str | None:
+        return self._urls.get(url)
 
+    def rename(self, old: str, new: str, url: str) -> None:
+        del self._names[old]
+        self._names[new] = url
+        self._urls[url] = new
 
-def main() -> None:
-    if not META_CACHE_PATH.exists():
-        raise FileNotFoundError(f"Meta cache not found: {META_CACHE_PATH}")
+    def drop(self, filename: str, url: str) -> None:
+        del self._names[filename]
+        self._urls.pop(url, None)
+
+
+class NameAllocator:
+    """
+    Pick deterministic filenames, avoiding collisions with other URLs.
+
+    - If a filename already maps to the same URL, reuse it.
+    - If the filename is used by another URL or reserved in this run, append counters.
+    """
+
+    def __init__(self, image_cache: ImageStore, view: PlannedCache | None = None) -> None:
+        self.image_cache = image_cache
+        self.view: ImageStore | PlannedCache = view if view is not None else image_cache
+        self.reserved: set[str] = set()
+        self._released: list[str] = []
+        self._saved = image_cache.name_cursors()
+        self._cursors = dict(self._saved)
+
+    def _cursor(self, key: tuple[str, str]) -> int:
+        return self._cursors.get(key, 1)
+
+    def choose(self, base: str, ext: str, url: str) -> str:
+        key = (base, ext)
+        slot = self._cursor(key)
+        while self._taken(name := slot_name(base, ext, slot)):
+            slot += 1
+        self._cursors[key] = slot
+
+        # Every slot below the cursor is taken; reuse one only if it is this URL's.
+        own = self.view.filename_for(url)
+        if (
+            own is not None
+            and own != name
+            and own.startswith(base)
+            and any(k == key and s < slot for k, s in name_slots(own))
+        ):
+            return own
+        return name
+
+    def _taken(self, name: str) -> bool:
+        return name in self.reserved or name in self.view
+
+    def reserve(self, name: str) -> None:
+        self.reserved.add(name)
+
+    def release(self, name: str) -> None:
+        """Mark `name` free again (renamed away, dropped or never downloaded)."""
+        self.reserved.discard(name)
+        self._released.append(name)
+        for key, slot in name_slots(name):
+            if slot < self._cursor(key):
+                self._cursors[key] = slot
+
+    def persist_releases(self) -> None:
+        """Move saved cursors back for released names; call before freeing them in the store."""
+        for name in self._released:
+            for key, slot in name_slots(name):
+                self.image_cache.lower_name_cursor(*key, slot)
+                if slot < self._saved.get(key, slot):
+                    self._saved[key] = slot
+        self._released.clear()
+
+    def save(self) -> None:
+        """Persist advanced cursors once reservations that never landed are released."""
+        for name in [name for name in self.reserved if name not in self.image_cache]:
+            self.release(name)
+        self.persist_releases()
+        for key, slot in self._cursors.items():
+            if slot != self._saved.get(key, 1):
+                self.image_cache.save_name_cursor(*key, slot)
+                self._saved[key] = slot
+
+
+class ThreadedDownloader:
+    """Run `download_image` on a thread pool that shares one pooled session."""
+
+    def __init__(
+        self,
+        workers: int,
+        segments: int = 1,
+        segment_threshold: int = DEFAULT_SEGMENT_THRESHOLD,
+        throttle: HostThrottle | None = None,
+        watchdog: TransferWatchdog | None = None,
+    ) -> None:
+        self.throttle = throttle or HostThrottle()
+        self.watchdog = watchdog or TransferWatchdog(min_rate=0)
+        self.session = build_session(pool_size=workers * segments)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.segments = segments
+        self.segment_threshold = segment_threshold
+
+    def __enter__(self) -> ThreadedDownloader:
+        self.watchdog.__enter__()
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, *exc_info: object) -> None:
+        # On errors (e.g. Ctrl-C) drop queued downloads instead of draining them.
+        self.pool.shutdown(cancel_futures=exc_type is not None)
+        self.watchdog.__exit__()
+        self.session.close()
+
+    def submit(
+        self,
+        url: str,
+        destination: Path,
+        label: str | None = None,
+        validators: dict[str, str] | None = None,
+    ) -> Future[dict[str, str] | None]:
+        return self.pool.submit(
+            download_image,
+            url,
+            destination,
+            session=self.session,
+            label=label,
+            validators=validators,
+            segments=self.segments,
+            segment_threshold=self.segment_threshold,
+            throttle=self.throttle,
+            watchdog=self.watchdog,
+        )
+
+
+def make_downloader(args: argparse.Namespace):
+    """Return the downloader backend chosen by `args` as a context manager."""
+    throttle = HostThrottle(
+        rate=args.rate,
+        bandwidth=args.bandwidth,
+        max_concurrency=args.workers if args.adaptive else None,
+        initial_concurrency=min(args.workers, ADAPTIVE_START),
+    )
+    watchdog = TransferWatchdog(min_rate=args.min_rate, window=args.stall_window)
+    if args.backend == "aiohttp":
+        from download_async import AsyncDownloader
+
+        return AsyncDownloader(
+            args.workers,
+            per_host=args.per_host,
+            headers={"User-Agent": USER_AGENT},
+            segments=args.segments,
+            segment_threshold=args.segment_threshold,
+            throttle=throttle,
+            watchdog=watchdog,
+        )
+    return ThreadedDownloader(
+        args.workers,
+        segments=args.segments,
+        segment_threshold=args.segment_threshold,
+        throttle=throttle,
+        watchdog=watchdog,
+    )
 
-    meta = json.loads(META_CACHE_PATH.read_text(encoding="utf-8"))
-    posters = meta.get("posters", [])
 
-    image_cache = load_json(IMAGE_CACHE_PATH)
-    url_to_filename = {url: name for name, url in image_cache.items()}
-    reserved_names = set(image_cache.keys())
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """The download options, shared with the run pipeline."""
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"number of concurrent downloads (default: {DEFAULT_WORKERS})",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="threads",
+        help="download backend; aiohttp keeps many requests in flight without threads",
+    )
+    parser.add_argument(
+        "--revalidate",
+        action="store_true",
+        help="re-check cached images with conditional requests and refresh changed ones",
+    )
+    parser.add_argument(
+        "--per-host",
+        type=int,
+        default=None,
+        help="connection limit per host for the aiohttp backend (default: --workers)",
+    )
+    parser.add_argument(
+        "--segments",
+        type=int,
+        default=1,
+        help="split large images into this many concurrent range requests (default: 1)",
+    )
+    parser.add_argument(
+        "--segment-threshold",
+        type=int,
+        default=DEFAULT_SEGMENT_THRESHOLD,
+        help="minimum size in bytes before an image is fetched in segments",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="maximum requests per second to each image host (default: unlimited)",
+    )
+    parser.add_argument(
+        "--bandwidth",
+        type=int,
+        default=None,
+        help="maximum bytes per second from each image host (default: unlimited)",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help=(
+            "adapt concurrency per host between 1 and --workers, backing off on "
+            "429/503 or rising latency"
+        ),
+    )
+    parser.add_argument(
+        "--min-rate",
+        type=int,
+        default=DEFAULT_MIN_RATE,
+        help=(
+            "requeue transfers receiving fewer bytes per second than this over "
+            f"--stall-window; 0 disables (default: {DEFAULT_MIN_RATE})"
+        ),
+    )
+    parser.add_argument(
+        "--stall-window",
+        type=float,
+        default=DEFAULT_WINDOW,
+        help=f"seconds over which --min-rate is measured (default: {DEFAULT_WINDOW:.0f})",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="print plan statistics without renaming or downloading anything",
+    )
+    parser.add_argument(
+        "--save-plan",
+        type=Path,
+        default=None,
+        help="write the planned actions as JSON to this path",
+    )
+    parser.add_argument(
+        "--pretty",
+        action="store_true",
+        help="indent JSON output for reading; it is compact by default",
+    )
+    parser.add_argument(
+        "--content-store",
+        choices=LINK_MODES,
+        default=None,
+        help=f"keep downloads in {STORE_DIR}/ by SHA-256 and link them into assets/",
+    )
 
-    downloaded = 0
-    skipped = 0
-    renamed = 0
 
-    ASSETS_DIR.mkdir(parents=True, exist_ok=True)
-    session = build_session()
+def check_arguments(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.segments < 1:
+        parser.error("--segments must be at least 1")
+    if args.per_host is not None and args.per_host < 1:
+        parser.error("--per-host must be at least 1")
+    if args.rate is not None and args.rate <= 0:
+        parser.error("--rate must be positive")
+    if args.bandwidth is not None and args.bandwidth < 1:
+        parser.error("--bandwidth must be at least 1")
+    if args.min_rate < 0:
+        parser.error("--min-rate must not be negative")
+    if args.stall_window <= 0:
+        parser.error("--stall-window must be positive")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Download poster images from the meta cache.")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    check_arguments(parser, args)
+    return args
+
+
+@dataclass
+class PlanAction:
+    """One step of a sync plan: skip, rename, download, revalidate or unresolved."""
+
+    kind: str
+    url: str
+    filename: str
+    label: str
+    source: str | None = None
+    drop: str | None = None
+    validators: dict[str, str] | None = None
+    expected_bytes: int | None = None
+    sha1: str | None = None
+
+
+def iter_plan(
+    posters: Iterable[Poster],
+    image_cache: ImageStore,
+    names: NameAllocator,
+    present: set[str],
+    revalidate: bool = False,
+) -> Iterator[PlanAction]:
+    """Decide what to do with every poster image without touching disk or network."""
+    view = names.view
+    present = set(present)
+    planned_urls: set[str] = set()
 
     for poster in posters:
-        images = poster.get("images", [])
-        for idx, url in enumerate(images):
-            if not url:
+        images = poster.images
+        title = poster.title
+        for idx, value in enumerate(images):
+            if not value:
+                continue
+            url, info = resolve_image(value, poster.files)
+            if "://" not in url:
+                yield PlanAction("unresolved", url, "", title)
                 continue
+            sha1 = info.get("sha1") if info else None
+
+            # Same URL listed again in this run: the first occurrence names it.
+            if url in planned_urls:
+                yield PlanAction("skip", url, "", title)
+                continue
+            planned_urls.add(url)
 
-            title = poster.get("title", "")
             base, ext = filename_from_title(title, url, idx, len(images))
-            target_filename = choose_filename(base, ext, url, image_cache, reserved_names)
+            target_filename = names.choose(base, ext, url)
+            label = title or target_filename
 
             # Already cached with correct name and present on disk.
-            if (
-                target_filename in image_cache
-                and image_cache[target_filename] == url
-                and (ASSETS_DIR / target_filename).exists()
-            ):
-                skipped += 1
+            if view.get(target_filename) == url and target_filename in present:
+                validators = image_cache.validators_for(target_filename) if revalidate else None
+                if validators:
+                    yield PlanAction(
+                        "revalidate",
+                        url,
+                        target_filename,
+                        label,
+                        validators=validators,
+                        expected_bytes=image_cache.size_for(target_filename),
+                        sha1=sha1,
+                    )
+                else:
+                    yield PlanAction("skip", url, target_filename, label)
                 continue
 
             # Same URL but stored under a different name: rename if the file exists.
-            existing_name = url_to_filename.get(url)
+            drop = None
+            existing_name = view.filename_for(url)
             if existing_name and existing_name != target_filename:
-                existing_path = ASSETS_DIR / existing_name
-                target_path = ASSETS_DIR / target_filename
-                if existing_path.exists():
-                    existing_path.rename(target_path)
-                    del image_cache[existing_name]
-                    reserved_names.discard(existing_name)
-                    image_cache[target_filename] = url
-                    url_to_filename[url] = target_filename
-                    reserved_names.add(target_filename)
-                    renamed += 1
-                    print(f"Renamed {existing_name} -> {target_filename}")
+                names.release(existing_name)
+                if existing_name in present:
+                    view.rename(existing_name, target_filename, url)
+                    present.discard(existing_name)
+                    present.add(target_filename)
+                    yield PlanAction(
+                        "rename", url, target_filename, label, source=existing_name
+                    )
                     continue
-                else:
-                    # Drop stale cache entry; will re-download.
-                    del image_cache[existing_name]
-                    reserved_names.discard(existing_name)
+                # Stale cache entry; drop it and re-download.
+                view.drop(existing_name, url)
+                drop = existing_name
+
+            # Reserve the name now so later posters cannot claim it mid-flight,
+            # even if this download fails; NameAllocator.save releases it.
+            names.reserve(target_filename)
+            yield PlanAction(
+                "download",
+                url,
+                target_filename,
+                label,
+                drop=drop,
+                expected_bytes=info.get("size") if info else None,
+                sha1=sha1,
+            )
+
+
+def plan_sync(
+    posters: Iterable[Poster],
+    image_cache: ImageStore,
+    names: NameAllocator,
+    present: set[str],
+    revalidate: bool = False,
+) -> list[PlanAction]:
+    """The whole plan at once; see iter_plan."""
+    return list(iter_plan(posters, image_cache, names, present, revalidate))
+
+
+def count_plan(actions: Iterable[PlanAction], counts: Counter[str]) -> Iterator[PlanAction]:
+    """Pass `actions` through, counting their kinds and the bytes they expect to fetch."""
+    for action in actions:
+        counts[action.kind] += 1
+        if action.kind in ("download", "revalidate"):
+            if action.expected_bytes is None:
+                counts["unknown size"] += 1
+            else:
+                counts["expected bytes"] += action.expected_bytes
+        yield action
+
+
+def summarize_plan(counts: Counter[str]) -> str:
+    kinds = ", ".join(
+        f"{kind}: {counts[kind]}"
+        for kind in ("download", "revalidate", "rename", "skip", "unresolved")
+    )
+    return (
+        f"Plan: {kinds}; expected bytes: {counts['expected bytes']} "
+        f"(+{counts['unknown size']} of unknown size)"
+    )
+
+
+def matches_local(action: PlanAction, image_cache: ImageStore) -> bool:
+    """Whether the file on disk for `action` already has the wiki's sha1."""
+    path = ASSETS_DIR / action.filename
+    if not action.sha1 or not path.exists():
+        return False
+    sha1 = image_cache.sha1_for(action.filename)
+    if sha1 is None:
+        sha1 = file_digest(path, "sha1").hexdigest()
+        image_cache.set_sha1(action.filename, sha1)
+    return sha1 == action.sha1
+
+
+def fetch_all(
+    actions: Iterable[PlanAction],
+    image_cache: ImageStore,
+    downloader: Any,
+    args: argparse.Namespace,
+    stats: Counter[str],
+) -> tuple[list[PlanAction], float]:
+    """Fetch `actions` concurrently; returns the deferred ones and how long to wait."""
+    deferred: list[PlanAction] = []
+    wait = 0.0
+
+    def finish(action: PlanAction, future: Future) -> None:
+        nonlocal wait
+        try:
+            fresh = future.result()
+        except HostUnavailable as exc:
+            deferred.append(action)
+            wait = max(wait, exc.retry_in)
+            return
+        except SlowTransfer as exc:
+            deferred.append(action)
+            stats["cut"] += 1
+            print(f"Requeued {action.filename}: {exc}")
+            return
+        except Exception as exc:  # noqa: BLE001
+            print(f"Failed to download {action.url} for {action.label}: {exc}")
+            return
 
-            destination = ASSETS_DIR / target_filename
+        if fresh is None:
+            stats["skipped"] += 1
+            return
+        sha256 = fresh.pop("sha256")
+        size = fresh.pop("size")
+        if args.content_store:
             try:
-                download_image(url, destination, session=session, label=title or target_filename)
-            except Exception as exc:  # noqa: BLE001
-                context = title or target_filename
-                print(f"Failed to download {url} for {context}: {exc}")
-                continue
+                duplicate = adopt(ASSETS_DIR / action.filename, sha256, args.content_store)
+            except OSError as exc:
+                print(f"Failed to store {action.filename} for {action.label}: {exc}")
+                return
+            stats["deduplicated"] += duplicate
+        image_cache.put(action.filename, action.url, fresh, sha256=sha256, size=size)
+        if action.kind == "revalidate":
+            stats["updated"] += 1
+            print(f"Updated {action.filename}")
+            return
 
-            image_cache[target_filename] = url
-            url_to_filename[url] = target_filename
-            reserved_names.add(target_filename)
-            downloaded += 1
-            print(f"Downloaded {target_filename}")
+        stats["downloaded"] += 1
+        print(f"Downloaded {action.filename}")
 
-    save_json(IMAGE_CACHE_PATH, image_cache)
+    # Names were fixed during planning, so recording results in the order
+    # they finish keeps the cache deterministic. They are recorded between
+    # submissions too: with a lazy plan, taking the next action may mean
+    # parsing more of the page, and finished downloads must reach the store
+    # (and its journal) meanwhile rather than once the plan runs out.
+    pending: dict[Future, PlanAction] = {}
+    finished: queue.SimpleQueue[Future] = queue.SimpleQueue()
+
+    def drain(block: bool) -> None:
+        while pending:
+            try:
+                future = finished.get(block=block)
+            except queue.Empty:
+                return
+            finish(pending.pop(future), future)
+
+    for action in actions:
+        future = downloader.submit(
+            action.url,
+            ASSETS_DIR / action.filename,
+            label=action.label,
+            validators=action.validators,
+        )
+        pending[future] = action
+        future.add_done_callback(finished.put)
+        drain(block=False)
+    drain(block=True)
+    return deferred, wait
+
+
+def apply_local(
+    plan: Iterable[PlanAction],
+    image_cache: ImageStore,
+    names: NameAllocator,
+    stats: Counter[str],
+) -> Iterator[PlanAction]:
+    """Carry out the steps of `plan` that need no network and yield the fetches."""
+    for action in plan:
+        # Cursors of names released while planning this step go back first.
+        names.persist_releases()
+        if action.kind == "skip":
+            stats["skipped"] += 1
+        elif action.kind == "unresolved":
+            stats["skipped"] += 1
+            print(f"Skipped {action.url} for {action.label}: not a file on the wiki")
+        elif action.kind == "rename":
+            (ASSETS_DIR / action.source).rename(ASSETS_DIR / action.filename)
+            image_cache.rename(action.source, action.filename)
+            stats["renamed"] += 1
+            print(f"Renamed {action.source} -> {action.filename}")
+        else:
+            if action.drop:
+                image_cache.delete(action.drop)
+            if not matches_local(action, image_cache):
+                yield action
+                continue
+            # The wiki vouches for the copy on disk; record it instead of fetching.
+            stats["verified"] += 1
+            if action.kind == "download":
+                path = ASSETS_DIR / action.filename
+                image_cache.put(
+                    action.filename,
+                    action.url,
+                    sha256=file_digest(path).hexdigest(),
+                    size=path.stat().st_size,
+                    sha1=action.sha1,
+                )
+                print(f"Verified {action.filename} by sha1")
+
+
+def execute_plan(
+    plan: Iterable[PlanAction],
+    image_cache: ImageStore,
+    names: NameAllocator,
+    args: argparse.Namespace,
+) -> Counter[str]:
+    """Apply a plan, submitting each fetch as soon as the steps before it are done."""
+    stats: Counter[str] = Counter()
+    pending: Iterable[PlanAction] = apply_local(plan, image_cache, names, stats)
+    deferrals: Counter[str] = Counter()
+    with make_downloader(args) as downloader:
+        while True:
+            deferred, wait = fetch_all(pending, image_cache, downloader, args, stats)
+            pending = []
+            for action in deferred:
+                deferrals[action.url] += 1
+                if deferrals[action.url] > MAX_DEFERRALS:
+                    print(
+                        f"Failed to download {action.url} for {action.label}: "
+                        f"still deferred after {MAX_DEFERRALS} retries"
+                    )
+                else:
+                    pending.append(action)
+            if not pending:
+                break
+            print(f"Retrying {len(pending)} deferred downloads in {wait:.0f}s")
+            time.sleep(wait)
+
+        for line in downloader.throttle.summary():
+            print(f"Adaptive concurrency for {line}")
+        if stats["cut"]:
+            print(f"Watchdog cut {stats['cut']} slow transfers")
+
+    names.save()
+    return stats
+
+
+def sync_images(posters: Iterable[Poster], args: argparse.Namespace) -> None:
+    """Plan and apply the downloads and renames for `posters` (see iter_plan)."""
+    # The store commits as results come in and on the way out, so an
+    # interrupted run keeps every download and rename that already finished.
+    with open_image_store(args.dry_run) as image_cache:
+        names = NameAllocator(image_cache, PlannedCache(image_cache))
+        if not args.dry_run:
+            ASSETS_DIR.mkdir(parents=True, exist_ok=True)
+        existing = scan_assets(ASSETS_DIR) if ASSETS_DIR.is_dir() else set()
+        counts: Counter[str] = Counter()
+        actions = count_plan(
+            iter_plan(posters, image_cache, names, existing, revalidate=args.revalidate), counts
+        )
+
+        if args.save_plan or args.dry_run:
+            started = time.perf_counter()
+            plan: list[PlanAction] = []
+            for action in actions:
+                # A dry run alone only needs the counts.
+                if args.save_plan:
+                    plan.append(action)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            print(f"{summarize_plan(counts)}; planned in {elapsed_ms:.0f} ms")
+            if args.save_plan:
+                serializer.write_file(
+                    args.save_plan, [asdict(action) for action in plan], args.pretty
+                )
+                print(f"Wrote plan to {args.save_plan}")
+            if args.dry_run:
+                return
+            stats = execute_plan(plan, image_cache, names, args)
+        else:
+            # Plan and fetch in one pass over the posters.
+            stats = execute_plan(actions, image_cache, names, args)
+            print(summarize_plan(counts))
+        total_cached = len(image_cache)
     print(
         "Done. "
-        f"Downloaded: {downloaded}, renamed: {renamed}, skipped: {skipped}, "
-        f"total cached: {len(image_cache)}"
+        f"Downloaded: {stats['downloaded']}, updated: {stats['updated']}, "
+        f"renamed: {stats['renamed']}, skipped: {stats['skipped']}, "
+        f"verified: {stats['verified']}, "
+        f"deduplicated: {stats['deduplicated']}, total cached: {total_cached}"
     )
 
 
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    sync_images(iter_posters(find_meta()), args)
+
+
 if __name__ == "__main__":
     main()
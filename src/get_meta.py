@@ -1,20 +1,73 @@
 from __future__ import annotations
 
+import argparse
+import hashlib
 import json
+import re
+from collections import Counter
+from collections.abc import Iterable, Iterator, Mapping
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Any
+from urllib.parse import unquote
 
 import mwparserfromhell
 import requests
 from mwparserfromhell.nodes.heading import Heading
 from mwparserfromhell.nodes.template import Template
 
+import serializer
+from meta_cache import FORMATS, find_meta, iter_posters, load_meta, poster_files, save_meta
+from poster import Poster
+from transfer import conditional_headers, response_validators
 
+
+PAGE_TITLE = "官方宣传图一览"
+API_URL = "https://prts.wiki/api.php"
 RAW_URL = (
     "https://prts.wiki/w/%E5%AE%98%E6%96%B9%E5%AE%A3%E4%BC%A0%E5%9B%BE%E4%B8%80%E8%A7%88"
     "?action=raw"
 )
-META_CACHE_PATH = Path("cache/meta_cache.json")
+# Last fetched wikitext and the revision/validators it was fetched at.
+WIKITEXT_PATH = Path("cache/wikitext.txt")
+WIKITEXT_STATE_PATH = Path("cache/wikitext.json")
+# Titles per imageinfo query; the API's limit for ordinary clients.
+IMAGEINFO_BATCH = 50
+FILE_NAMESPACES = ("File:", "文件:", "Image:", "图像:")
+# Originals and thumbnails on the wiki's upload host, capturing the file name.
+UPLOAD_URL_RE = re.compile(
+    r"https?://media\.prts\.wiki/(?:thumb/)?[0-9a-f]/[0-9a-f]{2}/(?P<name>[^/?#]+)"
+)
+# Markup that can hide a heading from the top level (templates, tables,
+# comments, HTML tags, wikilinks, bold/italic quotes) and level-2/3 heading
+# lines, scanned in document order.
+SECTION_MARKUP_RE = re.compile(
+    r"(?P<open>\{\{)|(?P<close>\}\})|^[ \t]*(?P<table>\{\|)|^[ \t]*(?P<endtable>\|\})"
+    r"|(?P<comment><!--)|(?P<link>\[\[)|(?P<endlink>\]\])|(?P<style>'')"
+    r"|(?P<tag><(?P<slash>/?)(?P<name>[A-Za-z][A-Za-z0-9]*)(?:[\s/][^<>]*)?>)"
+    r"|(?P<heading>^(?P<marks>={2,3})[^=\n].*?(?P=marks)[ \t]*$)",
+    re.MULTILINE,
+)
+# Tags whose contents are not wikitext: skipped to their closing tag.
+RAW_TAGS = frozenset({"nowiki", "pre", "math", "syntaxhighlight", "source"})
+# Tags that never take a closing tag.
+VOID_TAGS = frozenset({"br", "wbr", "hr", "img", "meta", "link"})
+# HTML tags, for checking that those in a heading line close within it.
+TAG_RE = re.compile(r"<(?P<slash>/?)(?P<name>[A-Za-z][A-Za-z0-9]*)(?:[\s/][^<>]*)?>")
+# Bold/italic quote runs, which close at the end of their line at the latest.
+STYLE_RUN_RE = re.compile(r"'{2,}")
+# What scan_section tracks: the `{{=}}`/`{{!}}` escapes, template braces and
+# parameter pipes. Template arguments (`{{{`) are left to mwparserfromhell.
+SCAN_TOKEN_RE = re.compile(r"\{\{[=!]\}\}|\{\{\{|\{\{|\}\}|\|")
+SCAN_HEADING_RE = re.compile(r"(?P<marks>={1,6})(?P<title>[^=\n]+)(?P=marks)[ \t]*")
+# A bracketed external link, inside which `|` and `=` do not split parameters.
+EXTERNAL_LINK_RE = re.compile(r"\[https?://[^\s\[\]<>{}|'\"]+(?:[ \t][^\[\]<>{}|\n']*)?\]")
+LINE_BREAK_TAG_RE = re.compile(r"<br\s*/?>", re.IGNORECASE)
+# Characters whose meaning depends on context the scanner does not model.
+HEADING_MARKUP = frozenset("[]{}<>'&")
+PARAM_MARKUP = frozenset("[]{}<>=")
+DESCRIPTION_MARKUP = frozenset("[]{}<>='&")
+LIST_MARKUP = ("\n*", "\n#", "\n:", "\n;", "\n----")
 
 
 def normalize_wiki_value(value: Any) -> str:
@@ -30,6 +83,179 @@ def fetch_wikitext(url: str) -> str:
     return resp.text
 
 
+def latest_revision(title: str) -> dict[str, Any]:
+    """Ask the MediaWiki API for the id and timestamp of the page's latest revision."""
+    params = {
+        "action": "query",
+        "prop": "revisions",
+        "titles": title,
+        "rvprop": "ids|timestamp",
+        "format": "json",
+        "formatversion": "2",
+    }
+    resp = requests.get(API_URL, params=params, timeout=20)
+    resp.raise_for_status()
+    revision = resp.json()["query"]["pages"][0]["revisions"][0]
+    return {"revid": revision["revid"], "timestamp": revision["timestamp"]}
+
+
+def file_title(value: str) -> str | None:
+    """The File: page behind an image parameter (a file name or upload URL), or None."""
+    for prefix in FILE_NAMESPACES:
+        if value.startswith(prefix):
+            return "File:" + value[len(prefix) :].strip()
+    match = UPLOAD_URL_RE.match(value)
+    if match:
+        return "File:" + unquote(match["name"])
+    if "://" not in value and "/" not in value and Path(value).suffix:
+        return "File:" + value
+    return None
+
+
+def fetch_image_info(titles: list[str]) -> tuple[dict[str, dict[str, Any]], int]:
+    """Look up File: pages with batched imageinfo queries; also returns the requests made."""
+    infos: dict[str, dict[str, Any]] = {}
+    requests_made = 0
+    for start in range(0, len(titles), IMAGEINFO_BATCH):
+        batch = titles[start : start + IMAGEINFO_BATCH]
+        params = {
+            "action": "query",
+            "prop": "imageinfo",
+            "iiprop": "url|size|sha1|mime",
+            "titles": "|".join(batch),
+            "redirects": "1",
+            "format": "json",
+            "formatversion": "2",
+        }
+        requests_made += 1
+        try:
+            # POST keeps 50 percent-encoded CJK titles clear of URL length limits.
+            resp = requests.post(API_URL, data=params, timeout=20)
+            resp.raise_for_status()
+            query = resp.json()["query"]
+        except (requests.RequestException, KeyError, ValueError) as exc:
+            print(f"Image info query failed ({exc}); {len(batch)} files left unresolved")
+            continue
+
+        sources: dict[str, list[str]] = {title: [title] for title in batch}
+        for step in query.get("normalized", []) + query.get("redirects", []):
+            sources.setdefault(step["to"], []).extend(sources.get(step["from"], []))
+        for page in query.get("pages", []):
+            if not page.get("imageinfo"):
+                continue
+            info = page["imageinfo"][0]
+            record = {
+                "url": info["url"],
+                "size": info.get("size"),
+                "width": info.get("width"),
+                "height": info.get("height"),
+                "sha1": info.get("sha1"),
+                "mime": info.get("mime"),
+            }
+            for title in sources.get(page["title"], [page["title"]]):
+                infos[title] = record
+    return infos, requests_made
+
+
+def iter_resolved(
+    posters: Iterable[Poster], files: dict[str, dict[str, Any]], stats: Counter[str]
+) -> Iterator[Poster]:
+    """
+    Yield `posters` in order with their `files` records attached, one imageinfo batch at a time.
+
+    Records found are added to `files`; stats["requests"] counts the API requests made.
+    """
+    pending: list[Poster] = []
+    titles: dict[str, str] = {}
+    asked: set[str] = set(files)
+
+    def resolve() -> list[Poster]:
+        nonlocal pending, titles
+        infos, requests_made = fetch_image_info(list(dict.fromkeys(titles.values())))
+        stats["requests"] += requests_made
+        files.update({value: infos[title] for value, title in titles.items() if title in infos})
+        for poster in pending:
+            poster.files = poster_files(poster, files)
+        done, pending, titles = pending, [], {}
+        return done
+
+    for poster in posters:
+        pending.append(poster)
+        for value in poster.images:
+            if value in asked:
+                continue
+            asked.add(value)
+            title = file_title(value)
+            if title:
+                titles[value] = title
+        if not titles or len(set(titles.values())) >= IMAGEINFO_BATCH:
+            yield from resolve()
+    if pending:
+        yield from resolve()
+
+
+def resolve_images(posters: list[Poster]) -> tuple[dict[str, dict[str, Any]], int]:
+    """Map each image parameter naming a wiki file to its imageinfo; also the requests made."""
+    files: dict[str, dict[str, Any]] = {}
+    stats: Counter[str] = Counter()
+    for _ in iter_resolved(posters, files, stats):
+        pass
+    return files, stats["requests"]
+
+
+def load_cached_wikitext() -> tuple[str | None, dict[str, Any]]:
+    """Return the cached wikitext (None if absent) and the state it was fetched with."""
+    if not WIKITEXT_PATH.exists():
+        return None, {}
+    try:
+        state = serializer.read_file(WIKITEXT_STATE_PATH)
+    except (OSError, ValueError):
+        state = {}
+    return WIKITEXT_PATH.read_text(encoding="utf-8"), state
+
+
+def save_cached_wikitext(wikitext: str, state: dict[str, Any]) -> None:
+    WIKITEXT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    WIKITEXT_PATH.write_text(wikitext, encoding="utf-8")
+    serializer.write_file(WIKITEXT_STATE_PATH, state)
+
+
+def fetch_wikitext_if_changed(
+    url: str, title: str, force: bool = False
+) -> tuple[str, dict[str, Any], bool]:
+    """
+    Return (wikitext, state, changed), downloading the page only if it was edited.
+
+    A new page is not cached here; the caller saves it once the meta cache reflects it.
+    """
+    cached, state = load_cached_wikitext()
+    if force:
+        cached, state = None, {}
+
+    try:
+        revision: dict[str, Any] = latest_revision(title)
+    except (requests.RequestException, KeyError, IndexError, ValueError) as exc:
+        print(f"Revision check failed ({exc}); falling back to a conditional fetch")
+        revision = {}
+
+    if cached is not None and revision and revision["revid"] == state.get("revid"):
+        return cached, state, False
+
+    headers = {}
+    if revision:
+        url = f"{url}&oldid={revision['revid']}"
+    elif cached is not None:
+        headers = conditional_headers(state)
+    resp = requests.get(url, timeout=20, headers=headers)
+    if resp.status_code == 304 and cached is not None:
+        return cached, state, False
+    resp.raise_for_status()
+
+    state = {**revision, **response_validators(resp.headers)}
+    state.pop("content_length", None)
+    return resp.text, state, True
+
+
 def parse_link_field(raw_link: str) -> tuple[str, str]:
     """
     Convert a wiki link field like `[https://... label]` into (url, label).
@@ -45,17 +271,34 @@ def parse_link_field(raw_link: str) -> tuple[str, str]:
     return url, label
 
 
-def extract_posters(wikitext: str) -> list[dict[str, Any]]:
-    """
-    Parse all `{{微博}}` templates and collect poster metadata.
+def poster_from_template(
+    template: Template, category: str | None, year: str | None
+) -> Poster:
+    """Build the poster record of one parsed `{{微博}}` template."""
+    link_field = template.get(1).value if template.has(1) else ""
+    weibo_url, title = parse_link_field(str(link_field))
 
-    Category and year are tracked by the nearest level-2 and level-3 headings
-    respectively, matching the table of contents on the wiki page.
-    """
+    description = ""
+    if template.has(2):
+        description = template.get(2).value.strip_code().strip()
+
+    image_urls: list[str] = []
+    for param in template.params:
+        name = str(param.name).strip()
+        if name.isdigit() and int(name) >= 3:
+            url = normalize_wiki_value(param.value)
+            if url:
+                image_urls.append(url)
+
+    return Poster(title, weibo_url, description, image_urls, category, year)
+
+
+def parse_section_tree(
+    wikitext: str, current_category: str | None = None, current_year: str | None = None
+) -> tuple[list[Poster], str | None, str | None]:
+    """parse_section on top of the full mwparserfromhell node tree."""
     code = mwparserfromhell.parse(wikitext)
-    posters: list[dict[str, Any]] = []
-    current_category: str | None = None
-    current_year: str | None = None
+    posters: list[Poster] = []
 
     for node in code.nodes:
         if isinstance(node, Heading):
@@ -67,51 +310,430 @@ def extract_posters(wikitext: str) -> list[dict[str, Any]]:
             elif level == 3:
                 current_year = title
             continue
-        if not isinstance(node, Template) or not node.name.matches("微博"):
+        if isinstance(node, Template) and node.name.matches("微博"):
+            posters.append(poster_from_template(node, current_category, current_year))
+
+    return posters, current_category, current_year
+
+
+def scan_headings(
+    text: str, at_line_start: bool, before_template: bool
+) -> list[tuple[int, str]] | None:
+    """Return the (level, title) of the heading lines in top-level `text`, or None if unsure."""
+    if "<" in text or "{|" in text or "''" in text:
+        return None
+    lines = text.split("\n")
+    if any(line.count("[[") != line.count("]]") for line in lines):
+        return None
+    last = lines[-1]
+    if before_template and last:
+        word = "" if last[-1].isspace() else last.rsplit(None, 1)[-1]
+        if last.startswith("=") or "[" in last or ":" in word:
+            return None
+    headings = []
+    for index, line in enumerate(lines):
+        if not line.startswith("=") or (index == 0 and not at_line_start):
             continue
-        template = node
-
-        link_field = template.get(1).value if template.has(1) else ""
-        weibo_url, title = parse_link_field(str(link_field))
-
-        description = ""
-        if template.has(2):
-            description = template.get(2).value.strip_code().strip()
-
-        image_urls: list[str] = []
-        for param in template.params:
-            name = str(param.name).strip()
-            if name.isdigit() and int(name) >= 3:
-                url = normalize_wiki_value(param.value)
-                if url:
-                    image_urls.append(url)
-
-        posters.append(
-            {
-                "title": title,
-                "weibo_url": weibo_url,
-                "description": description,
-                "images": image_urls,
-                "category": current_category,
-                "year": current_year,
+        match = SCAN_HEADING_RE.fullmatch(line)
+        if not match or HEADING_MARKUP.intersection(match["title"]):
+            return None
+        headings.append((len(match["marks"]), match["title"].strip()))
+    return headings
+
+
+def unescape_param(value: str) -> str:
+    return value.replace("{{=}}", "").replace("{{!}}", "")
+
+
+def scan_template(
+    wikitext: str, pipes: list[int], end: int, category: str | None, year: str | None
+) -> Poster | None:
+    """Build the poster of the `{{微博}}` template whose pipes are at `pipes`, or None."""
+    params = [wikitext[start + 1 : stop] for start, stop in zip(pipes, pipes[1:] + [end])]
+    for index, value in enumerate(params):
+        plain = unescape_param(value)
+        if index == 1:
+            if DESCRIPTION_MARKUP.intersection(plain) or any(m in plain for m in LIST_MARKUP):
+                return None
+        elif PARAM_MARKUP.intersection(EXTERNAL_LINK_RE.sub("", plain)):
+            return None
+
+    weibo_url, title = parse_link_field(params[0]) if params else ("", "")
+    description = ""
+    if len(params) > 1:
+        # What Wikicode.strip_code() does to plain text.
+        description = unescape_param(params[1]).strip("\n")
+        while "\n\n\n" in description:
+            description = description.replace("\n\n\n", "\n\n")
+        description = description.strip()
+    image_urls = [url for url in map(normalize_wiki_value, params[2:]) if url]
+    return Poster(title, weibo_url, description, image_urls, category, year)
+
+
+def scan_section(
+    wikitext: str, current_category: str | None = None, current_year: str | None = None
+) -> tuple[list[Poster], str | None, str | None] | None:
+    """parse_section without building a node tree; None where the tree parse is needed."""
+    posters: list[Poster] = []
+    depth = 0
+    start = done = 0
+    nested = False
+    pipes: list[int] = []
+
+    def enter(text: str, at_line_start: bool, before_template: bool) -> bool:
+        nonlocal current_category, current_year
+        headings = scan_headings(text, at_line_start, before_template)
+        if headings is None:
+            return False
+        for level, title in headings:
+            if level == 2:
+                current_category, current_year = title, None
+            elif level == 3:
+                current_year = title
+        return True
+
+    for match in SCAN_TOKEN_RE.finditer(wikitext):
+        token = match.group()
+        if token == "{{{":
+            return None
+        if token == "|":
+            if depth == 1:
+                pipes.append(match.start())
+        elif token == "{{":
+            depth += 1
+            if depth == 1:
+                at_line_start = done == 0 or wikitext[done - 1] == "\n"
+                if not enter(wikitext[done : match.start()], at_line_start, True):
+                    return None
+                start, nested, pipes = match.start(), False, []
+            else:
+                nested = True
+        elif token == "}}":
+            if depth == 0:
+                return None
+            depth -= 1
+            if depth:
+                continue
+            done = match.end()
+            span = wikitext[start:done]
+            if "<" in LINE_BREAK_TAG_RE.sub("", span) or span.count("[[") != span.count("]]"):
+                return None
+            name = wikitext[start + 2 : pipes[0] if pipes else match.start()].strip()
+            if not name or "\n" in name or PARAM_MARKUP.intersection(name):
+                return None
+            if name != "微博":
+                continue
+            poster = None
+            if not nested:
+                poster = scan_template(
+                    wikitext, pipes, match.start(), current_category, current_year
+                )
+            if poster is None:
+                nodes = mwparserfromhell.parse(span).nodes
+                if len(nodes) != 1 or not isinstance(nodes[0], Template):
+                    return None
+                poster = poster_from_template(nodes[0], current_category, current_year)
+            posters.append(poster)
+
+    if depth:
+        return None
+    at_line_start = done == 0 or wikitext[done - 1] == "\n"
+    if not enter(wikitext[done:], at_line_start, False):
+        return None
+    return posters, current_category, current_year
+
+
+def parse_section(
+    wikitext: str, current_category: str | None = None, current_year: str | None = None
+) -> tuple[list[Poster], str | None, str | None]:
+    """
+    Parse all `{{微博}}` templates and collect poster metadata.
+
+    Category and year are tracked by the nearest level-2 and level-3 headings
+    respectively, matching the table of contents on the wiki page.
+    """
+    scanned = scan_section(wikitext, current_category, current_year)
+    if scanned is not None:
+        return scanned
+    return parse_section_tree(wikitext, current_category, current_year)
+
+
+def balanced_styles(wikitext: str, pos: int) -> bool:
+    """Whether every `''`/`'''` run on the line around `pos` is closed on it again."""
+    start = wikitext.rfind("\n", 0, pos) + 1
+    end = wikitext.find("\n", pos)
+    runs = Counter(STYLE_RUN_RE.findall(wikitext, start, len(wikitext) if end < 0 else end))
+    return all(count % 2 == 0 for count in runs.values())
+
+
+def self_contained(heading: str) -> bool:
+    """Whether the markup in a heading line is closed again within the line."""
+    if "''" in heading or "<!--" in heading:
+        return False
+    if heading.count("{{") != heading.count("}}") or heading.count("[[") != heading.count("]]"):
+        return False
+    tags: Counter[str] = Counter()
+    for tag in TAG_RE.finditer(heading):
+        name = tag["name"].lower()
+        if name in RAW_TAGS:
+            return False
+        if name not in VOID_TAGS and not tag.group().endswith("/>"):
+            tags[name] += -1 if tag["slash"] else 1
+    return not any(tags.values())
+
+
+def split_sections(wikitext: str) -> list[str]:
+    """split_headed_sections without the heading levels."""
+    return [section for section, _ in split_headed_sections(wikitext)]
+
+
+def split_headed_sections(wikitext: str) -> list[tuple[str, int]]:
+    """
+    Split the page in front of every level-2/3 heading line the parser is sure to read as one.
+
+    Returns each section with the level of the heading it starts with, or 0.
+    """
+    starts = [(0, 0)]
+    nesting: list[str] = []
+    tables = pos = 0
+    tags: Counter[str] = Counter()
+    while match := SECTION_MARKUP_RE.search(wikitext, pos):
+        pos = match.end()
+        kind = match.lastgroup
+        if kind == "comment":
+            end = wikitext.find("-->", pos)
+            pos = len(wikitext) if end < 0 else end + 3
+        elif kind == "tag":
+            name = match["name"].lower()
+            if match["slash"]:
+                tags[name] = max(0, tags[name] - 1)
+            elif name in VOID_TAGS or match["tag"].endswith("/>"):
+                pass
+            elif name in RAW_TAGS:
+                end = re.compile(f"</{name}", re.IGNORECASE).search(wikitext, pos)
+                if end is None:
+                    break
+                pos = end.start()
+            else:
+                tags[name] += 1
+        elif kind in ("open", "link"):
+            nesting.append(match.group())
+        elif kind in ("close", "endlink"):
+            opener = "{{" if kind == "close" else "[["
+            if nesting and nesting[-1] == opener:
+                nesting.pop()
+            elif opener in nesting:
+                break
+        elif kind == "table":
+            tables += 1
+        elif kind == "endtable":
+            tables = max(0, tables - 1)
+        elif kind == "style":
+            if not nesting or not balanced_styles(wikitext, match.start()):
+                break
+        elif not nesting and not tables and not any(tags.values()):
+            contained = self_contained(match.group())
+            level = len(match["marks"]) if contained else 0
+            if match.start():
+                starts.append((match.start(), level))
+            else:
+                starts[0] = (0, level)
+            if not contained:
+                break
+    starts.append((len(wikitext), 0))
+    return [
+        (wikitext[start:end], level)
+        for (start, level), (end, _) in zip(starts, starts[1:])
+    ]
+
+
+def section_hash(section: str, category: str | None, year: str | None) -> str:
+    """Identify a section by its text and the heading context it is parsed in."""
+    # Always stdlib json: the hashes are stored, so they must not depend on the backend.
+    digest = hashlib.sha256(json.dumps([category, year], ensure_ascii=False).encode("utf-8"))
+    digest.update(section.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def split_chapters(wikitext: str) -> list[list[str]]:
+    """Group the sections of the page into chapters opened by a confirmed level-2 heading."""
+    chapters: list[list[str]] = []
+    for section, level in split_headed_sections(wikitext):
+        if not chapters or level == 2:
+            chapters.append([])
+        chapters[-1].append(section)
+    return chapters
+
+
+def iter_chapter(
+    sections: list[str], known: Mapping[str, tuple[str | None, str | None]]
+) -> Iterator[tuple[str, list[Poster] | None, str | None, str | None]]:
+    """Yield (hash, posters, category, year) per section, posters None if in `known`."""
+    category: str | None = None
+    year: str | None = None
+    for section in sections:
+        key = section_hash(section, category, year)
+        if key in known:
+            category, year = known[key]
+            yield key, None, category, year
+        else:
+            posters, category, year = parse_section(section, category, year)
+            yield key, posters, category, year
+
+
+def parse_chapter(
+    sections: list[str], known: Mapping[str, tuple[str | None, str | None]]
+) -> list[tuple[str, list[Poster] | None, str | None, str | None]]:
+    """iter_chapter all at once, as the process pool needs it."""
+    return list(iter_chapter(sections, known))
+
+
+def iter_chapter_results(
+    chapters: list[list[str]], known: Mapping[str, tuple[str | None, str | None]], workers: int
+) -> Iterator[tuple[str, list[Poster] | None, str | None, str | None]]:
+    """iter_chapter over every chapter, in page order, in a process pool if `workers` > 1."""
+    if workers > 1 and len(chapters) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chapters))) as pool:
+            futures = {
+                index: pool.submit(parse_chapter, chapters[index], known)
+                for index in sorted(
+                    range(len(chapters)), key=lambda i: -sum(map(len, chapters[i]))
+                )
             }
-        )
+            for index in range(len(chapters)):
+                yield from futures[index].result()
+    else:
+        for chapter in chapters:
+            yield from iter_chapter(chapter, known)
+
+
+def iter_sections(
+    wikitext: str, previous: Mapping[str, Any], workers: int = 1
+) -> Iterator[tuple[dict[str, Any], list[Poster], bool]]:
+    """Parse only the sections that changed since `previous` (an earlier meta cache)."""
+    old_posters = previous.get("posters", [])
+    known: dict[str, tuple[dict[str, Any], list[Poster]]] = {}
+    offset = 0
+    for record in previous.get("sections", []):
+        known.setdefault(record["hash"], (record, old_posters[offset : offset + record["count"]]))
+        offset += record["count"]
+    if offset != len(old_posters):
+        known = {}
+    contexts = {key: (record["category"], record["year"]) for key, (record, _) in known.items()}
+
+    results = iter_chapter_results(split_chapters(wikitext), contexts, workers)
+    for key, section_posters, category, year in results:
+        parsed = section_posters is not None
+        if section_posters is None:
+            section_posters = known[key][1]
+        record = {"hash": key, "count": len(section_posters), "category": category, "year": year}
+        yield record, section_posters, parsed
+
+
+def extract_posters_incremental(
+    wikitext: str, previous: dict[str, Any], workers: int = 1
+) -> tuple[list[Poster], list[dict[str, Any]], int]:
+    """iter_sections all at once: (posters, sections, number of sections parsed)."""
+    posters: list[Poster] = []
+    sections: list[dict[str, Any]] = []
+    parsed = 0
+    for record, section_posters, was_parsed in iter_sections(wikitext, previous, workers):
+        posters.extend(section_posters)
+        sections.append(record)
+        parsed += was_parsed
+    return posters, sections, parsed
 
-    return posters
 
+def iter_extract_posters(wikitext: str, workers: int = 1) -> Iterator[Poster]:
+    """Yield the posters of the whole page in order, each section's as soon as it is parsed."""
+    for _, posters, _ in iter_sections(wikitext, {}, workers):
+        yield from posters
 
-def main() -> None:
-    wikitext = fetch_wikitext(RAW_URL)
-    posters = extract_posters(wikitext)
 
-    payload = {"source": RAW_URL, "count": len(posters), "posters": posters}
+def extract_posters(wikitext: str, workers: int = 1) -> list[Poster]:
+    """Parse the whole page; see parse_section and iter_sections."""
+    return list(iter_extract_posters(wikitext, workers))
 
-    META_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
-    META_CACHE_PATH.write_text(
-        json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8"
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Extract poster metadata from the wiki page.")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="download and reparse the page even if it has not been edited",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of parsing processes (default: 1)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=sorted(FORMATS),
+        default="json",
+        help="meta cache format; jsonl has one poster per line for streaming readers",
+    )
+    parser.add_argument(
+        "--pretty",
+        action="store_true",
+        help="indent the json meta cache for reading; it is compact by default",
     )
+    return parser.parse_args(argv)
+
+
+def update_meta(
+    force: bool = False, workers: int = 1, fmt: str = "json", pretty: bool = False
+) -> Iterator[Poster]:
+    """Bring the meta cache up to date with the wiki page, yielding its posters as they come."""
+    wikitext, state, changed = fetch_wikitext_if_changed(RAW_URL, PAGE_TITLE, force=force)
+    revid = state.get("revid")
+    try:
+        meta_path: Path | None = find_meta()
+    except FileNotFoundError:
+        meta_path = None
+    if not changed and meta_path == FORMATS[fmt]:
+        print(f"Page unchanged (revision {revid}); keeping {meta_path}")
+        yield from iter_posters(meta_path)
+        return
+
+    previous: dict[str, Any] = {}
+    if meta_path and not force:
+        previous = load_meta(meta_path)
+    sections: list[dict[str, Any]] = []
+    stats: Counter[str] = Counter()
+
+    def parsed_posters() -> Iterator[Poster]:
+        for record, section_posters, was_parsed in iter_sections(wikitext, previous, workers):
+            sections.append(record)
+            stats["parsed"] += was_parsed
+            yield from section_posters
+
+    posters: list[Poster] = []
+    known: dict[str, dict[str, Any]] = previous.get("files", {})
+    files = dict(known)
+    for poster in iter_resolved(parsed_posters(), files, stats):
+        posters.append(poster)
+        yield poster
+    # Drop the records of images no longer on the page.
+    files = {value: info for poster in posters for value, info in poster.files.items()}
+    print(f"Parsed {stats['parsed']} of {len(sections)} sections")
+    print(
+        f"Resolved {len(files)} image files ({len(files.keys() & known.keys())} already known) "
+        f"with {stats['requests']} imageinfo requests"
+    )
+
+    header = {"source": RAW_URL, "revision": revid, "count": len(posters), "sections": sections}
+    meta_path = save_meta(header, posters, files, fmt, pretty)
+    save_cached_wikitext(wikitext, state)
+
+    print(f"Wrote {len(posters)} poster entries to {meta_path}")
+
 
-    print(f"Wrote {len(posters)} poster entries to {META_CACHE_PATH}")
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    for _ in update_meta(args.force, args.workers, args.format, args.pretty):
+        pass
 
 
 if __name__ == "__main__":
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import sqlite3
+import time
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+from typing import Any
+
+
+VALIDATOR_COLUMNS = ("etag", "last_modified", "content_length")
+FLUSH_EVERY = 64
+FLUSH_INTERVAL = 2.0
+CHECKPOINT_EVERY = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    filename TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    size INTEGER,
+    sha256 TEXT,
+    sha1 TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    content_length TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_url ON images (url);
+CREATE TABLE IF NOT EXISTS name_cursors (
+    base TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    next_slot INTEGER NOT NULL,
+    PRIMARY KEY (base, ext)
+);
+"""
+
+
+class ImageStore(Mapping[str, str]):
+    """SQLite-backed record of downloaded images, read as a `filename -> url` mapping."""
+
+    def __init__(
+        self,
+        path: Path,
+        flush_every: int = FLUSH_EVERY,
+        flush_interval: float = FLUSH_INTERVAL,
+    ) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(images)")}
+        if "sha1" not in columns:
+            self.conn.execute("ALTER TABLE images ADD COLUMN sha1 TEXT")
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._pending = 0
+        self._commits = 0
+        self._last_flush = time.monotonic()
+
+    def __enter__(self) -> ImageStore:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.checkpoint()
+        self.conn.close()
+
+    def commit(self) -> None:
+        self.conn.commit()
+        self._pending = 0
+        self._commits += 1
+        self._last_flush = time.monotonic()
+        if self._commits % CHECKPOINT_EVERY == 0:
+            self.checkpoint()
+
+    def checkpoint(self) -> None:
+        """Fold the write-ahead log into the database file and truncate it."""
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def _changed(self) -> None:
+        self._pending += 1
+        if (
+            self._pending >= self.flush_every
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.commit()
+
+    def __getitem__(self, filename: str) -> str:
+        query = "SELECT url FROM images WHERE filename = ?"
+        row = self.conn.execute(query, (filename,)).fetchone()
+        if row is None:
+            raise KeyError(filename)
+        return row["url"]
+
+    def __iter__(self) -> Iterator[str]:
+        for row in self.conn.execute("SELECT filename FROM images ORDER BY rowid"):
+            yield row["filename"]
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    def snapshot(self) -> dict[str, str]:
+        """Every `filename -> url` pair in insertion order, read in one query."""
+        query = "SELECT filename, url FROM images ORDER BY rowid"
+        return {row["filename"]: row["url"] for row in self.conn.execute(query)}
+
+    def filename_for(self, url: str) -> str | None:
+        row = self.conn.execute(
+            "SELECT filename FROM images WHERE url = ? ORDER BY rowid DESC LIMIT 1", (url,)
+        ).fetchone()
+        return row["filename"] if row else None
+
+    def validators_for(self, filename: str) -> dict[str, str]:
+        """Stored ETag/Last-Modified/Content-Length of `filename`, as download_image expects."""
+        row = self.conn.execute(
+            "SELECT etag, last_modified, content_length FROM images WHERE filename = ?",
+            (filename,),
+        ).fetchone()
+        if row is None:
+            return {}
+        return {key: row[key] for key in VALIDATOR_COLUMNS if row[key]}
+
+    def size_for(self, filename: str) -> int | None:
+        row = self.conn.execute(
+            "SELECT size FROM images WHERE filename = ?", (filename,)
+        ).fetchone()
+        return row["size"] if row else None
+
+    def sha1_for(self, filename: str) -> str | None:
+        """SHA-1 of `filename`, if it has been computed since it was last written."""
+        row = self.conn.execute(
+            "SELECT sha1 FROM images WHERE filename = ?", (filename,)
+        ).fetchone()
+        return row["sha1"] if row else None
+
+    def set_sha1(self, filename: str, sha1: str) -> None:
+        self.conn.execute("UPDATE images SET sha1 = ? WHERE filename = ?", (sha1, filename))
+        self._changed()
+
+    def integrity(self) -> Iterator[tuple[str, str, int]]:
+        """Yield (filename, sha256, size) for every image with a recorded digest."""
+        query = "SELECT filename, sha256, size FROM images WHERE sha256 IS NOT NULL"
+        for row in self.conn.execute(query + " ORDER BY filename"):
+            yield row["filename"], row["sha256"], row["size"]
+
+    def put(
+        self,
+        filename: str,
+        url: str,
+        validators: Mapping[str, str] | None = None,
+        sha256: str | None = None,
+        size: int | None = None,
+        sha1: str | None = None,
+    ) -> None:
+        """Insert or refresh the record for `filename`."""
+        self._upsert(filename, url, validators, sha256, size, sha1)
+        self._changed()
+
+    def _upsert(
+        self,
+        filename: str,
+        url: str,
+        validators: Mapping[str, str] | None,
+        sha256: str | None,
+        size: int | None,
+        sha1: str | None = None,
+    ) -> None:
+        validators = validators or {}
+        now = time.time()
+        self.conn.execute(
+            """
+            INSERT INTO images (
+                filename, url, size, sha256, sha1, etag, last_modified, content_length,
+                created_at, updated_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (filename) DO UPDATE SET
+                url = excluded.url,
+                size = excluded.size,
+                sha256 = excluded.sha256,
+                sha1 = excluded.sha1,
+                etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                content_length = excluded.content_length,
+                updated_at = excluded.updated_at
+            """,
+            (
+                filename,
+                url,
+                size,
+                sha256,
+                sha1,
+                *(validators.get(key) for key in VALIDATOR_COLUMNS),
+                now,
+                now,
+            ),
+        )
+
+    def rename(self, old: str, new: str) -> None:
+        self.conn.execute("DELETE FROM images WHERE filename = ?", (new,))
+        self.conn.execute(
+            "UPDATE images SET filename = ?, updated_at = ? WHERE filename = ?",
+            (new, time.time(), old),
+        )
+        self._changed()
+
+    def delete(self, filename: str) -> None:
+        self.conn.execute("DELETE FROM images WHERE filename = ?", (filename,))
+        self._changed()
+
+    def name_cursors(self) -> dict[tuple[str, str], int]:
+        """First collision slot that may be free for every saved `(base, ext)`."""
+        rows = self.conn.execute("SELECT base, ext, next_slot FROM name_cursors")
+        return {(row["base"], row["ext"]): row["next_slot"] for row in rows}
+
+    def save_name_cursor(self, base: str, ext: str, slot: int) -> None:
+        self.conn.execute(
+            """
+            INSERT INTO name_cursors (base, ext, next_slot) VALUES (?, ?, ?)
+            ON CONFLICT (base, ext) DO UPDATE SET next_slot = excluded.next_slot
+            """,
+            (base, ext, slot),
+        )
+        self._changed()
+
+    def lower_name_cursor(self, base: str, ext: str, slot: int) -> None:
+        """Move a saved cursor back to `slot` if it is past it."""
+        self.conn.execute(
+            "UPDATE name_cursors SET next_slot = ? WHERE base = ? AND ext = ? AND next_slot > ?",
+            (slot, base, ext, slot),
+        )
+        self._changed()
+
+    def import_json(
+        self,
+        image_cache: Mapping[str, str],
+        image_headers: Mapping[str, Mapping[str, Any]],
+        integrity: Mapping[str, Mapping[str, Any]],
+    ) -> None:
+        """Load the contents of the legacy JSON cache files in one transaction."""
+        with self.conn:
+            for filename, url in image_cache.items():
+                entry = integrity.get(filename, {})
+                self._upsert(
+                    filename, url, image_headers.get(url), entry.get("sha256"), entry.get("size")
+                )
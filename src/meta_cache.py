@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator, Mapping
+from pathlib import Path
+from typing import Any
+
+import serializer
+from poster import Poster
+from serializer import FileInfo, PosterRecord
+
+
+META_JSON_PATH = Path("cache/meta_cache.json")
+META_JSONL_PATH = Path("cache/meta_cache.jsonl")
+FORMATS = {"json": META_JSON_PATH, "jsonl": META_JSONL_PATH}
+
+
+def find_meta() -> Path:
+    """The meta cache get_meta wrote last, in whichever format it used."""
+    existing = [path for path in FORMATS.values() if path.exists()]
+    if not existing:
+        raise FileNotFoundError(f"Meta cache not found: {META_JSON_PATH} or {META_JSONL_PATH}")
+    return max(existing, key=lambda path: path.stat().st_mtime)
+
+
+def poster_files(poster: Poster, files: Mapping[str, Any]) -> dict[str, Any]:
+    """The imageinfo records of `poster`'s images."""
+    return {value: files[value] for value in poster.images if value in files}
+
+
+def save_meta(
+    header: Mapping[str, Any],
+    posters: Iterable[Poster],
+    files: Mapping[str, Any],
+    fmt: str = "json",
+    pretty: bool = False,
+) -> Path:
+    """
+    Write the meta cache and remove the one in the other format.
+
+    "jsonl" puts `header` on the first line, then one poster per line with its own `files`.
+    """
+    path = FORMATS[fmt]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if fmt == "json":
+        records = [poster.to_record(files=False) for poster in posters]
+        payload = {**header, "posters": records, "files": dict(files)}
+        serializer.write_file(path, payload, pretty)
+    else:
+        with path.open("wb") as file:
+            file.write(serializer.dumps(dict(header)) + b"\n")
+            for poster in posters:
+                record = poster.to_record(files=False)
+                own = poster_files(poster, files)
+                if own:
+                    record["files"] = own
+                file.write(serializer.dumps(record) + b"\n")
+    for other in FORMATS.values():
+        if other != path:
+            other.unlink(missing_ok=True)
+    return path
+
+
+def read_header(path: Path) -> dict[str, Any]:
+    """Everything in the meta cache but the posters and their files."""
+    if path.suffix == ".jsonl":
+        with path.open("rb") as file:
+            return serializer.loads(file.readline() or b"{}")
+    meta = serializer.read_file(path)
+    meta.pop("posters", None)
+    meta.pop("files", None)
+    return meta
+
+
+def iter_posters(path: Path) -> Iterator[Poster]:
+    """Yield the posters of a meta cache in order, with their `files` records."""
+    if path.suffix == ".jsonl":
+        with path.open("rb") as file:
+            file.readline()
+            for number, line in enumerate(file, start=2):
+                if line.strip():
+                    record = serializer.loads(line, PosterRecord, f"{path}:{number}")
+                    yield Poster.from_record(record)
+        return
+    yield from document_posters(serializer.read_file(path), path)
+
+
+def document_posters(meta: Mapping[str, Any], path: Path) -> Iterator[Poster]:
+    """The posters of an already decoded JSON meta cache, as iter_posters yields them."""
+    files = serializer.validate(meta.get("files", {}), dict[str, FileInfo], f"{path}: files")
+    for index, record in enumerate(meta.get("posters", [])):
+        poster = Poster.from_record(
+            serializer.validate(record, PosterRecord, f"{path}: posters[{index}]")
+        )
+        poster.files = poster_files(poster, files)
+        yield poster
+
+
+def load_meta(path: Path) -> dict[str, Any]:
+    """The whole meta cache in the JSON layout, whatever format it is in."""
+    if path.suffix == ".jsonl":
+        meta = read_header(path)
+        records = iter_posters(path)
+    else:
+        meta = serializer.read_file(path)
+        records = document_posters(meta, path)
+    posters: list[Poster] = []
+    files: dict[str, Any] = {}
+    for poster in records:
+        files.update(poster.files)
+        poster.files = {}
+        posters.append(poster)
+    header = {key: value for key, value in meta.items() if key not in ("posters", "files")}
+    return {**header, "posters": posters, "files": files}
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import sys
+from dataclasses import dataclass, field
+from typing import Any
+
+from serializer import FileInfo, PosterRecord
+
+
+def intern_optional(value: str | None) -> str | None:
+    return None if value is None else sys.intern(value)
+
+
+@dataclass(slots=True)
+class Poster:
+    """One `{{微博}}` entry, as get_meta extracts it and the other stages read it."""
+
+    title: str
+    weibo_url: str
+    description: str
+    images: list[str]
+    category: str | None = None
+    year: str | None = None
+    files: dict[str, FileInfo] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self.category = intern_optional(self.category)
+        self.year = intern_optional(self.year)
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # Rebuild through __init__ so posters coming back from parsing
+        # processes are interned again in the receiving one.
+        return Poster, (
+            self.title,
+            self.weibo_url,
+            self.description,
+            self.images,
+            self.category,
+            self.year,
+            self.files,
+        )
+
+    @classmethod
+    def from_record(cls, record: PosterRecord) -> Poster:
+        """The poster of a meta cache record already checked against PosterRecord."""
+        return cls(
+            record["title"],
+            record["weibo_url"],
+            record["description"],
+            record["images"],
+            record["category"],
+            record["year"],
+            record.get("files", {}),
+        )
+
+    def to_record(self, files: bool = True) -> PosterRecord:
+        """The meta cache record of this poster; `files` only if requested and known."""
+        record: PosterRecord = {
+            "title": self.title,
+            "weibo_url": self.weibo_url,
+            "description": self.description,
+            "images": self.images,
+            "category": self.category,
+            "year": self.year,
+        }
+        if files and self.files:
+            record["files"] = self.files
+        return record
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import argparse
+import time
+from collections.abc import Iterable, Iterator
+
+import get_category
+import get_image
+import get_meta
+from meta_cache import FORMATS, find_meta
+from poster import Poster
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Update the meta cache, download the images and count the categories."
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="download and reparse the page even if it has not been edited",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=1,
+        help="number of page parsing processes (default: 1)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=sorted(FORMATS),
+        default="json",
+        help="meta cache format; jsonl has one poster per line for streaming readers",
+    )
+    get_image.add_arguments(parser)
+    args = parser.parse_args(argv)
+    get_image.check_arguments(parser, args)
+    if args.parse_workers < 1:
+        parser.error("--parse-workers must be at least 1")
+    return args
+
+
+def collect(
+    posters: Iterable[Poster], seen: list[Poster], timings: dict[str, float], stage: str
+) -> Iterator[Poster]:
+    """Pass `posters` on, keeping them in `seen` and adding the time taken to produce them."""
+    iterator = iter(posters)
+    while True:
+        started = time.perf_counter()
+        poster = next(iterator, None)
+        timings[stage] += time.perf_counter() - started
+        if poster is None:
+            return
+        seen.append(poster)
+        yield poster
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Run get_meta, get_image and get_category in one process, passing posters in memory."""
+    args = parse_args(argv)
+    timings: dict[str, float] = {"meta": 0.0}
+
+    started = time.perf_counter()
+    posters = get_meta.update_meta(args.force, args.parse_workers, args.format, args.pretty)
+    seen: list[Poster] = []
+    get_image.sync_images(collect(posters, seen, timings, "meta"), args)
+    timings["images"] = time.perf_counter() - started - timings["meta"]
+
+    started = time.perf_counter()
+    get_category.update_categories(seen, find_meta(), args.pretty)
+    timings["categories"] = time.perf_counter() - started
+
+    stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+    print(f"Timings: {stages}; total {sum(timings.values()):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
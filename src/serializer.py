@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import json
+import functools
+import os
+import types
+import typing
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, TypedDict
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional dependency
+    msgspec = None
+
+
+# In order of preference; stdlib json is always available.
+BACKENDS = ("orjson", "msgspec", "json")
+# Name of a backend to use instead of the fastest installed one.
+BACKEND_ENV = "POSTER_JSON_BACKEND"
+
+
+class FormatError(ValueError):
+    """Data is not valid JSON or does not have the expected structure."""
+
+
+class FileInfo(TypedDict):
+    """What the wiki's imageinfo API reports about one image file."""
+
+    url: str
+    size: int | None
+    width: int | None
+    height: int | None
+    sha1: str | None
+    mime: str | None
+
+
+class _PosterRecordFields(TypedDict):
+    title: str
+    weibo_url: str
+    description: str
+    images: list[str]
+    category: str | None
+    year: str | None
+
+
+class PosterRecord(_PosterRecordFields, total=False):
+    """One `{{微博}}` entry of the meta cache; `files` only once its images are resolved."""
+
+    files: dict[str, FileInfo]
+
+
+def available_backends() -> list[str]:
+    modules = {"orjson": orjson, "msgspec": msgspec, "json": json}
+    return [name for name in BACKENDS if modules[name] is not None]
+
+
+def choose_backend(name: str | None = None) -> str:
+    """`name`, else $POSTER_JSON_BACKEND, else the fastest installed backend."""
+    name = name or os.environ.get(BACKEND_ENV) or available_backends()[0]
+    if name not in available_backends():
+        raise RuntimeError(f"JSON backend {name!r} is not installed; have {available_backends()}")
+    return name
+
+
+backend = choose_backend()
+
+
+def set_backend(name: str) -> None:
+    global backend
+    backend = choose_backend(name)
+
+
+def dumps(obj: Any, pretty: bool = False) -> bytes:
+    """UTF-8 JSON for `obj`: compact, or indented by two spaces if `pretty`."""
+    if backend == "orjson":
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if backend == "msgspec":
+        data = msgspec.json.encode(obj)
+        return msgspec.json.format(data, indent=2) if pretty else data
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: bytes | str, kind: Any = None, where: str = "$") -> Any:
+    """Decode JSON, checking it against the type `kind` (e.g. PosterRecord) if given."""
+    try:
+        if backend == "msgspec":
+            return msgspec.json.decode(data, type=Any if kind is None else kind)
+        obj = orjson.loads(data) if backend == "orjson" else json.loads(data)
+    except ValueError as exc:
+        raise FormatError(f"{where}: {exc}") from exc
+    except Exception as exc:
+        if msgspec is not None and isinstance(exc, msgspec.DecodeError):
+            raise FormatError(f"{where}: {exc}") from exc
+        raise
+    return obj if kind is None else validate(obj, kind, where)
+
+
+def validate(obj: Any, kind: Any, where: str = "$") -> Any:
+    """Return `obj` if it matches the type `kind`, else raise FormatError."""
+    if msgspec is not None and backend == "msgspec":
+        try:
+            return msgspec.convert(obj, type=kind)
+        except msgspec.ValidationError as exc:
+            raise FormatError(f"{where}: {exc}") from exc
+    if not _predicate(kind)(obj):
+        _check(obj, kind, where)
+    return obj
+
+
+@functools.cache
+def _predicate(kind: Any) -> Callable[[Any], bool]:
+    """A fast yes/no check for `kind`; _check then finds out what is wrong."""
+    scalars = _scalar_types(kind)
+    if scalars is not None:
+        return lambda obj: isinstance(obj, scalars)
+    origin = typing.get_origin(kind)
+    if kind is Any:
+        return lambda obj: True
+    if origin in (typing.Union, types.UnionType):
+        options = [_predicate(option) for option in typing.get_args(kind)]
+        return lambda obj: any(option(obj) for option in options)
+    if origin in (list, dict):
+        item = typing.get_args(kind)[-1]
+        item_scalars = _scalar_types(item)
+        item_check = _predicate(item)
+        values = list.__iter__ if origin is list else dict.values
+
+        def check_items(obj: Any) -> bool:
+            if type(obj) is not origin:
+                return False
+            for value in values(obj):
+                if not (isinstance(value, item_scalars) if item_scalars else item_check(value)):
+                    return False
+            return True
+
+        return check_items
+    if typing.is_typeddict(kind):
+        simple = []
+        nested = []
+        for key, field in _fields(kind).items():
+            field_scalars = _scalar_types(field)
+            if field_scalars is not None:
+                simple.append((key, field_scalars))
+            else:
+                nested.append((key, _predicate(field)))
+        required = kind.__required_keys__
+
+        def check(obj: Any) -> bool:
+            if type(obj) is not dict or not required <= obj.keys():
+                return False
+            for key, expected in simple:
+                if key in obj and not isinstance(obj[key], expected):
+                    return False
+            for key, field in nested:
+                if key in obj and not field(obj[key]):
+                    return False
+            return True
+
+        return check
+    return lambda obj: isinstance(obj, kind)
+
+
+def _scalar_types(kind: Any) -> tuple[type, ...] | None:
+    """`kind` as an isinstance() tuple if it is a plain class or a union of them."""
+    options = typing.get_args(kind) if typing.get_origin(kind) in (
+        typing.Union, types.UnionType
+    ) else (kind,)
+    options = tuple(type(None) if option is None else option for option in options)
+    if all(option in (str, int, float, bool, type(None)) for option in options):
+        return options
+    return None
+
+
+def _check(obj: Any, kind: Any, where: str) -> None:
+    origin = typing.get_origin(kind)
+    if kind is Any:
+        return
+    if kind is None or kind is type(None):
+        ok = obj is None
+    elif origin in (typing.Union, types.UnionType):
+        for option in typing.get_args(kind):
+            try:
+                _check(obj, option, where)
+                return
+            except FormatError:
+                continue
+        ok = False
+    elif origin is list:
+        ok = isinstance(obj, list)
+        if ok:
+            (item,) = typing.get_args(kind)
+            for index, value in enumerate(obj):
+                _check(value, item, f"{where}[{index}]")
+    elif origin is dict:
+        ok = isinstance(obj, dict)
+        if ok:
+            _, item = typing.get_args(kind)
+            for key, value in obj.items():
+                _check(value, item, f"{where}.{key}")
+    elif typing.is_typeddict(kind):
+        ok = isinstance(obj, dict)
+        if ok:
+            for key, field in _fields(kind).items():
+                if key in obj:
+                    _check(obj[key], field, f"{where}.{key}")
+                elif key in kind.__required_keys__:
+                    raise FormatError(f"{where}: missing field {key!r}")
+    else:
+        ok = isinstance(obj, kind)
+    if not ok:
+        raise FormatError(f"{where}: expected {getattr(kind, '__name__', kind)}, got {obj!r:.40}")
+
+
+@functools.cache
+def _fields(kind: type) -> dict[str, Any]:
+    return typing.get_type_hints(kind)
+
+
+def read_file(path: Path, kind: Any = None) -> Any:
+    return loads(path.read_bytes(), kind)
+
+
+def write_file(path: Path, obj: Any, pretty: bool = False) -> None:
+    path.write_bytes(dumps(obj, pretty))
@@ -0,0 +1,376 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from types import TracebackType
+from urllib.parse import urlsplit
+
+
+# Statuses worth retrying; the first two are a host asking us to slow down.
+BACKOFF_STATUSES = frozenset({429, 503})
+RETRY_STATUSES = BACKOFF_STATUSES | {500, 502, 504}
+LATENCY_TOLERANCE = 2.0
+WARMUP_SAMPLES = 10
+
+
+class HostUnavailable(Exception):
+    """A host's circuit breaker is open; its URLs should wait `retry_in` seconds."""
+
+    def __init__(self, host: str, retry_in: float) -> None:
+        super().__init__(f"{host} is unavailable for another {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+def retry_after(headers: Mapping[str, str]) -> float | None:
+    """Seconds asked for by a Retry-After header (delta-seconds or HTTP-date), if any."""
+    value = headers.get("Retry-After", "").strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+@dataclass
+class RetryPolicy:
+    """How often and how long (with decorrelated jitter) to retry a failed download attempt."""
+
+    attempts: int = 4
+    base: float = 1.0
+    cap: float = 30.0
+
+    def next_delay(self, previous: float) -> float:
+        return min(self.cap, random.uniform(self.base, max(self.base, previous) * 3))
+
+
+class CircuitBreaker:
+    """Per-host breaker that opens after `threshold` consecutive failures."""
+
+    def __init__(
+        self, threshold: int = 5, cooldown: float = 15.0, max_cooldown: float = 120.0
+    ) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self.lock = threading.Lock()
+
+    def remaining(self) -> float:
+        """Seconds until the breaker closes, 0 when it is closed."""
+        return max(0.0, self.open_until - time.monotonic())
+
+    def success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.trips = 0
+
+    def failure(self) -> None:
+        with self.lock:
+            if self.open_until > time.monotonic():
+                return
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self._trip(None)
+
+    def trip(self, duration: float | None = None) -> None:
+        """Open the breaker now, for `duration` seconds or the next cooldown."""
+        with self.lock:
+            self._trip(duration)
+
+    def _trip(self, duration: float | None) -> None:
+        if duration is None:
+            duration = min(self.max_cooldown, self.cooldown * 2**self.trips)
+        self.open_until = max(self.open_until, time.monotonic() + duration)
+        self.trips += 1
+        self.failures = self.threshold - 1
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` per second up to `burst`."""
+
+    def __init__(self, rate: float, burst: float | None = None) -> None:
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, amount: float = 1.0) -> float:
+        """Withdraw `amount` tokens and return the delay in seconds they are owed."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+
+def _wake(waiter: asyncio.Future[None]) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit for one host."""
+
+    def __init__(
+        self,
+        initial: int,
+        maximum: int,
+        minimum: int = 1,
+        tolerance: float = LATENCY_TOLERANCE,
+    ) -> None:
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self.active = 0
+        self.generation = 0
+        self.cuts = 0
+        self._healthy = 0
+        self._samples = 0
+        self._baseline = 0.0
+        self._recent = 0.0
+        self._cond = threading.Condition()
+        self._waiters: list[asyncio.Future[None]] = []
+
+    @property
+    def current(self) -> int:
+        return max(self.minimum, int(self.limit))
+
+    def _try_acquire(self) -> int | None:
+        if self.active >= self.current:
+            return None
+        self.active += 1
+        return self.generation
+
+    def acquire(self) -> int:
+        """Block until a slot is free; returns a ticket to pass to `release`."""
+        with self._cond:
+            while (ticket := self._try_acquire()) is None:
+                self._cond.wait()
+            return ticket
+
+    async def acquire_async(self) -> int:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                ticket = self._try_acquire()
+                if ticket is not None:
+                    return ticket
+                waiter = loop.create_future()
+                self._waiters.append(waiter)
+            await waiter
+
+    def _slow(self, latency: float) -> bool:
+        """Fold `latency` into the short and long averages; True if it has risen too far."""
+        self._samples += 1
+        if self._samples == 1:
+            self._baseline = self._recent = latency
+            return False
+        self._baseline += 0.05 * (latency - self._baseline)
+        self._recent += 0.3 * (latency - self._recent)
+        return self._samples > WARMUP_SAMPLES and self._recent > self.tolerance * self._baseline
+
+    def release(self, ticket: int, latency: float | None, backoff: bool) -> bool:
+        """Free a slot and adapt the limit to how the request went; True if it was cut."""
+        with self._cond:
+            self.active -= 1
+            slow = latency is not None and self._slow(latency)
+            cut = False
+            if backoff or slow:
+                if ticket == self.generation:
+                    self.limit = max(float(self.minimum), self.limit / 2)
+                    self.generation += 1
+                    self.cuts += 1
+                    self._healthy = 0
+                    cut = True
+            elif latency is not None:
+                self._healthy += 1
+                if self._healthy >= self.limit:
+                    self.limit = min(float(self.maximum), self.limit + 1)
+                    self._healthy = 0
+
+            free = max(0, self.current - self.active)
+            self._cond.notify(free)
+            waiters = [waiter for waiter in self._waiters if not waiter.done()]
+            woken, self._waiters = waiters[:free], waiters[free:]
+        for waiter in woken:
+            waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+        return cut
+
+
+@dataclass
+class HostLimits:
+    name: str
+    requests: TokenBucket | None
+    bytes: TokenBucket | None
+    concurrency: AdaptiveLimit | None
+    breaker: CircuitBreaker
+
+
+class Slot:
+    """One request's share of its host's limits, handed out by `HostThrottle.slot`."""
+
+    def __init__(self, host: HostLimits, hold: bool) -> None:
+        self.host = host
+        self.hold = hold and host.concurrency is not None
+        self.ticket: int | None = None
+        self.started = time.monotonic()
+        self.latency: float | None = None
+        self.status: int | None = None
+        self.retry_after: float | None = None
+
+    def responded(self, status: int, headers: Mapping[str, str]) -> None:
+        """Record the time to first byte, the status and any Retry-After."""
+        self.latency = time.monotonic() - self.started
+        self.status = status
+        self.retry_after = retry_after(headers) if status in RETRY_STATUSES else None
+
+    @property
+    def backoff(self) -> bool:
+        return self.status in BACKOFF_STATUSES
+
+    @property
+    def retryable(self) -> bool:
+        """False only for an error status that retrying cannot fix (404, 403, ...)."""
+        return not (
+            self.status is not None and self.status >= 400 and self.status not in RETRY_STATUSES
+        )
+
+    def __enter__(self) -> Slot:
+        if self.hold:
+            self.ticket = self.host.concurrency.acquire()
+        delay = self.host.requests.take() if self.host.requests else 0.0
+        if delay:
+            time.sleep(delay)
+        self.started = time.monotonic()
+        return self
+
+    async def __aenter__(self) -> Slot:
+        if self.hold:
+            self.ticket = await self.host.concurrency.acquire_async()
+        delay = self.host.requests.take() if self.host.requests else 0.0
+        if delay:
+            await asyncio.sleep(delay)
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        # Interruptions and cancellation say nothing about the host.
+        if exc_type is None or issubclass(exc_type, Exception):
+            if exc_type is not None and self.retryable:
+                self.host.breaker.failure()
+            else:
+                self.host.breaker.success()
+        limit = self.host.concurrency
+        if self.ticket is not None and limit is not None:
+            # No response at all (refused, reset, timed out) counts as pushback.
+            backoff = self.backoff or (exc_type is not None and self.latency is None)
+            if limit.release(self.ticket, self.latency, backoff):
+                print(f"Backing off {self.host.name}: {limit.current} concurrent downloads")
+            self.ticket = None
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.__exit__(exc_type, exc, traceback)
+
+    def consume(self, size: int) -> None:
+        """Charge `size` body bytes to the host, sleeping if over its bandwidth."""
+        delay = self.host.bytes.take(size) if self.host.bytes else 0.0
+        if delay:
+            time.sleep(delay)
+
+    async def consume_async(self, size: int) -> None:
+        delay = self.host.bytes.take(size) if self.host.bytes else 0.0
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class HostThrottle:
+    """Per-host limits and retry policy shared by every download of a run."""
+
+    def __init__(
+        self,
+        rate: float | None = None,
+        bandwidth: int | None = None,
+        max_concurrency: int | None = None,
+        initial_concurrency: int | None = None,
+        policy: RetryPolicy | None = None,
+    ) -> None:
+        self.policy = policy or RetryPolicy()
+        self.rate = rate
+        self.bandwidth = bandwidth
+        self.max_concurrency = max_concurrency
+        self.initial_concurrency = initial_concurrency or max_concurrency
+        self._hosts: dict[str, HostLimits] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def adaptive(self) -> bool:
+        return self.max_concurrency is not None
+
+    def host(self, url: str) -> HostLimits:
+        name = urlsplit(url).netloc
+        with self._lock:
+            if name not in self._hosts:
+                self._hosts[name] = HostLimits(
+                    name,
+                    TokenBucket(self.rate) if self.rate else None,
+                    TokenBucket(self.bandwidth) if self.bandwidth else None,
+                    AdaptiveLimit(self.initial_concurrency, self.max_concurrency)
+                    if self.max_concurrency
+                    else None,
+                    CircuitBreaker(),
+                )
+            return self._hosts[name]
+
+    def slot(self, url: str, hold: bool = True) -> Slot:
+        """A download's segments pass `hold=False` to share its concurrency slot."""
+        return Slot(self.host(url), hold)
+
+    def check(self, url: str) -> None:
+        """Raise HostUnavailable if the breaker of `url`'s host is open."""
+        host = self.host(url)
+        remaining = host.breaker.remaining()
+        if remaining:
+            raise HostUnavailable(host.name, remaining)
+
+    def retry_delay(self, slot: Slot, previous: float) -> float | None:
+        """Seconds to wait before retrying the attempt made in `slot`, or None not to retry."""
+        if not slot.retryable:
+            return None
+        breaker = slot.host.breaker
+        if slot.retry_after is not None and slot.retry_after > self.policy.cap:
+            breaker.trip(slot.retry_after)
+        if breaker.remaining():
+            return 0.0
+        return max(self.policy.next_delay(previous), slot.retry_after or 0.0)
+
+    def summary(self) -> list[str]:
+        """One line per host with its final adaptive concurrency limit."""
+        return [
+            f"{host.name}: {host.concurrency.current} concurrent downloads "
+            f"(cut {host.concurrency.cuts} times)"
+            for host in self._hosts.values()
+            if host.concurrency is not None
+        ]
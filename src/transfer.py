@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+from typing import IO, Any
+
+import serializer
+from throttle import HostThrottle, Slot
+from transfer_watchdog import SlowTransfer
+
+
+CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class ResumeMismatch(ValueError):
+    """A ranged response does not continue the `.part` file on disk."""
+
+
+def response_validators(headers: Mapping[str, str]) -> dict[str, str]:
+    """Pick the cache validators worth keeping from a response's headers."""
+    validators: dict[str, str] = {}
+    for header, key in (
+        ("ETag", "etag"),
+        ("Last-Modified", "last_modified"),
+        ("Content-Length", "content_length"),
+    ):
+        value = headers.get(header)
+        if value:
+            validators[key] = value
+    return validators
+
+
+def conditional_headers(validators: Mapping[str, str] | None) -> dict[str, str]:
+    """Build If-None-Match/If-Modified-Since headers from stored validators."""
+    if not validators:
+        return {}
+    headers: dict[str, str] = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+def partial_meta_path(temp_path: Path) -> Path:
+    """Sidecar file recording which response a `.part` file belongs to."""
+    return temp_path.with_name(temp_path.name + ".json")
+
+
+def range_validator(validators: Mapping[str, str]) -> str:
+    """Return a value usable in If-Range (strong ETag or Last-Modified), or ''."""
+    etag = validators.get("etag", "")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return validators.get("last_modified", "")
+
+
+def start_partial(temp_path: Path, validators: Mapping[str, str]) -> None:
+    """Remember the validators of a fresh body so the `.part` can be resumed later."""
+    meta_path = partial_meta_path(temp_path)
+    if validators.get("content_length") and range_validator(validators):
+        serializer.write_file(meta_path, dict(validators))
+    else:
+        meta_path.unlink(missing_ok=True)
+
+
+def discard_partial(temp_path: Path) -> None:
+    temp_path.unlink(missing_ok=True)
+    partial_meta_path(temp_path).unlink(missing_ok=True)
+
+
+def release_partial(temp_path: Path) -> None:
+    """After a failed attempt, keep the `.part` only if it can be resumed."""
+    if not partial_meta_path(temp_path).exists():
+        temp_path.unlink(missing_ok=True)
+
+
+def load_partial(temp_path: Path) -> tuple[int, dict[str, str]]:
+    """Return (offset, validators) for a leftover `.part`; (0, {}) after removing one."""
+    meta_path = partial_meta_path(temp_path)
+    if not temp_path.exists() or not meta_path.exists():
+        discard_partial(temp_path)
+        return 0, {}
+    try:
+        validators = serializer.read_file(meta_path)
+    except (OSError, ValueError):
+        validators = {}
+    offset = temp_path.stat().st_size
+    total = validators.get("content_length", "")
+    if not range_validator(validators) or not total.isdigit() or offset >= int(total):
+        discard_partial(temp_path)
+        return 0, {}
+    return offset, validators
+
+
+def range_headers(offset: int, validators: Mapping[str, str]) -> dict[str, str]:
+    """Headers asking for the rest of a partial body, guarded by If-Range."""
+    if not offset:
+        return {}
+    return {"Range": f"bytes={offset}-", "If-Range": range_validator(validators)}
+
+
+def resume_offset(
+    status: int, headers: Mapping[str, str], offset: int, validators: Mapping[str, str]
+) -> int:
+    """Return where the response body starts within the file (0 for a full body)."""
+    if status != 206:
+        return 0
+    content_range = headers.get("Content-Range", "")
+    match = CONTENT_RANGE_RE.fullmatch(content_range.strip())
+    if (
+        not match
+        or int(match.group(1)) != offset
+        or match.group(3) != validators.get("content_length")
+    ):
+        raise ResumeMismatch(f"Unexpected Content-Range {content_range!r} resuming at {offset}")
+    return offset
+
+
+def check_segment(
+    status: int, headers: Mapping[str, str], start: int, validators: Mapping[str, str]
+) -> None:
+    """Raise ResumeMismatch unless the response is the requested slice of the same body."""
+    if status != 206:
+        raise ResumeMismatch(f"Server ignored the range request for byte {start} (HTTP {status})")
+    resume_offset(status, headers, start, validators)
+
+
+def segment_bounds(total: int, segments: int) -> list[tuple[int, int]]:
+    """Split `total` bytes into `segments` contiguous inclusive (start, end) ranges."""
+    size = -(-total // segments)
+    return [(start, min(start + size, total) - 1) for start in range(0, total, size)]
+
+
+def can_segment(headers: Mapping[str, str], validators: Mapping[str, str], threshold: int) -> bool:
+    """Whether a fresh full response is large and range-capable enough to split."""
+    total = validators.get("content_length", "")
+    return (
+        total.isdigit()
+        and int(total) >= threshold
+        and headers.get("Accept-Ranges", "").lower() == "bytes"
+        and bool(range_validator(validators))
+    )
+
+
+def segment_headers(start: int, end: int, validators: Mapping[str, str]) -> dict[str, str]:
+    return {"Range": f"bytes={start}-{end}", "If-Range": range_validator(validators)}
+
+
+def check_complete(temp_path: Path, validators: Mapping[str, str]) -> int:
+    """Return the size of the finished `.part`, raising if it differs from the announced one."""
+    expected = validators.get("content_length", "")
+    size = temp_path.stat().st_size
+    if expected.isdigit() and size != int(expected):
+        raise OSError(f"Incomplete download: got {size} of {expected} bytes")
+    return size
+
+
+def file_digest(path: Path, algorithm: str = "sha256") -> hashlib._Hash:
+    """Digest of a file on disk, e.g. the SHA-256 of the prefix of a resumed `.part` file."""
+    digest = hashlib.new(algorithm)
+    with path.open("rb") as file:
+        while block := file.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest
+
+
+class BodyWriter:
+    """Append response chunks to a `.part` file, hashing them as they are written."""
+
+    def __init__(self, file: IO[bytes], digest: hashlib._Hash) -> None:
+        self.file = file
+        self.digest = digest
+
+    def __enter__(self) -> BodyWriter:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.file.close()
+
+    def write(self, chunk: bytes) -> None:
+        self.file.write(chunk)
+        self.digest.update(chunk)
+
+
+class RangeWriter:
+    """Write chunks into bytes start..end (inclusive) of a preallocated file."""
+
+    def __init__(self, path: Path, start: int, end: int) -> None:
+        self.start = start
+        self.end = end
+        self.remaining = end - start + 1
+        self.file = path.open("r+b")
+        self.file.seek(start)
+
+    def __enter__(self) -> RangeWriter:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.file.close()
+
+    def write(self, chunk: bytes) -> int:
+        """Write what of `chunk` still fits in the range; returns how much that was."""
+        if len(chunk) > self.remaining:
+            chunk = memoryview(chunk)[: self.remaining]
+        self.file.write(chunk)
+        self.remaining -= len(chunk)
+        return len(chunk)
+
+    def check(self) -> None:
+        if self.remaining:
+            raise OSError(f"Segment {self.start}-{self.end} ended {self.remaining} bytes short")
+
+
+class Download:
+    """One URL to fetch into `destination`; the backends bring the HTTP client."""
+
+    def __init__(
+        self,
+        url: str,
+        destination: Path,
+        throttle: HostThrottle,
+        label: str | None = None,
+        validators: dict[str, str] | None = None,
+        segments: int = 1,
+        segment_threshold: int = 0,
+    ) -> None:
+        self.url = url
+        self.destination = destination
+        self.temp_path = destination.with_suffix(destination.suffix + ".part")
+        self.throttle = throttle
+        self.label = label
+        self.validators = validators
+        self.segments = segments
+        self.segment_threshold = segment_threshold
+        self.offset = 0
+        self.partial: dict[str, str] = {}
+        self.start = 0
+        self.fresh: dict[str, str] = {}
+        self.delay = 0.0
+
+    def attempts(self) -> Iterator[int]:
+        """Number the attempts; HostUnavailable once the host's circuit breaker is open."""
+        for attempt in range(1, self.throttle.policy.attempts + 1):
+            self.throttle.check(self.url)
+            yield attempt
+
+    def request_headers(self) -> dict[str, str]:
+        """Headers for the next attempt: conditional, and resuming a leftover `.part`."""
+        self.offset, self.partial = load_partial(self.temp_path)
+        return {**conditional_headers(self.validators), **range_headers(self.offset, self.partial)}
+
+    def accept(self, status: int, headers: Mapping[str, str]) -> bool:
+        """Take in a successful response; True if its body is to be fetched in segments."""
+        self.start = resume_offset(status, headers, self.offset, self.partial)
+        self.fresh = self.partial if self.start else response_validators(headers)
+        return (
+            not self.start
+            and self.segments > 1
+            and can_segment(headers, self.fresh, self.segment_threshold)
+        )
+
+    def open_body(self) -> BodyWriter:
+        """Open the `.part` for the body; a resumed one is hashed up to where it stopped."""
+        if self.start:
+            return BodyWriter(self.temp_path.open("ab"), file_digest(self.temp_path))
+        start_partial(self.temp_path, self.fresh)
+        return BodyWriter(self.temp_path.open("wb"), hashlib.sha256())
+
+    def segment_bounds(self) -> list[tuple[int, int]]:
+        """Preallocate the `.part` for a segmented body and return its byte ranges."""
+        # Segmented files are written in place and cannot be resumed.
+        partial_meta_path(self.temp_path).unlink(missing_ok=True)
+        total = int(self.fresh["content_length"])
+        with self.temp_path.open("wb") as file:
+            file.truncate(total)
+        return segment_bounds(total, self.segments)
+
+    def segment_headers(self, start: int, end: int) -> dict[str, str]:
+        return segment_headers(start, end, self.fresh)
+
+    def check_segment(self, status: int, headers: Mapping[str, str], start: int) -> None:
+        check_segment(status, headers, start, self.fresh)
+
+    def complete(self, digest: hashlib._Hash | None) -> dict[str, Any]:
+        """Move the finished `.part` into place; returns its validators, `sha256` and `size`."""
+        size = check_complete(self.temp_path, self.fresh)
+        # Segments arrive out of order, so those files are hashed once complete.
+        sha256 = (digest or file_digest(self.temp_path)).hexdigest()
+        partial_meta_path(self.temp_path).unlink(missing_ok=True)
+        self.temp_path.replace(self.destination)
+        return {**self.fresh, "sha256": sha256, "size": size}
+
+    def retry_delay(self, exc: Exception, slot: Slot, attempt: int) -> float | None:
+        """Clean up after a failed attempt; the wait before the next, or None to raise `exc`."""
+        if isinstance(exc, ResumeMismatch):
+            discard_partial(self.temp_path)
+        else:
+            release_partial(self.temp_path)
+        if isinstance(exc, SlowTransfer):
+            return None
+        delay = self.throttle.retry_delay(slot, self.delay)
+        if delay is None:
+            return None
+        self.delay = delay
+        # An open breaker defers the URL rather than failing it.
+        self.throttle.check(self.url)
+        if attempt == self.throttle.policy.attempts:
+            return None
+        label_text = f" ({self.label})" if self.label else ""
+        print(
+            f"Retry {attempt}/{self.throttle.policy.attempts} for {self.url}{label_text} "
+            f"in {delay:.1f}s after error: {exc}"
+        )
+        return delay
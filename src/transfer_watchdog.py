@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from types import TracebackType
+
+
+DEFAULT_MIN_RATE = 1024
+DEFAULT_WINDOW = 30.0
+
+
+class SlowTransfer(OSError):
+    """A body arrived slower than the watchdog's minimum throughput and was aborted."""
+
+
+class Transfer:
+    """Progress of one response body, registered with a `TransferWatchdog`."""
+
+    def __init__(self, watchdog: TransferWatchdog, abort: Callable[[], None]) -> None:
+        self.watchdog = watchdog
+        self.abort = abort
+        self.received = 0
+        self.started = time.monotonic()
+        self.samples: deque[tuple[float, int]] = deque([(self.started, 0)])
+        self.cut = False
+        self.paused = False
+
+    def progress(self, size: int) -> None:
+        self.received += size
+
+    @contextmanager
+    def pause(self) -> Iterator[None]:
+        """Stop the clock while the transfer waits on our own bandwidth limit."""
+        self.paused = True
+        try:
+            yield
+        finally:
+            self.paused = False
+
+    def __enter__(self) -> Transfer:
+        self.watchdog.register(self)
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.watchdog.unregister(self)
+        if self.cut:
+            elapsed = time.monotonic() - self.started
+            raise SlowTransfer(
+                f"Aborted after {self.received} bytes in {elapsed:.0f}s: "
+                f"below {self.watchdog.min_rate} B/s over {self.watchdog.window:.0f}s"
+            ) from exc
+
+
+class TransferWatchdog:
+    """Background thread aborting response bodies slower than `min_rate` over `window`."""
+
+    def __init__(
+        self,
+        min_rate: int = DEFAULT_MIN_RATE,
+        window: float = DEFAULT_WINDOW,
+        interval: float = 1.0,
+    ) -> None:
+        self.min_rate = min_rate
+        self.window = window
+        self.interval = interval
+        self.cuts = 0
+        self._transfers: set[Transfer] = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def __enter__(self) -> TransferWatchdog:
+        if self.min_rate:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def watch(self, abort: Callable[[], None]) -> Transfer:
+        """A transfer to enter around a body read; `abort` is called to cut it."""
+        return Transfer(self, abort)
+
+    def register(self, transfer: Transfer) -> None:
+        if self.min_rate:
+            with self._lock:
+                self._transfers.add(transfer)
+
+    def unregister(self, transfer: Transfer) -> None:
+        with self._lock:
+            self._transfers.discard(transfer)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            now = time.monotonic()
+            with self._lock:
+                transfers = list(self._transfers)
+            for transfer in transfers:
+                if not transfer.cut and self._too_slow(transfer, now):
+                    transfer.cut = True
+                    self.cuts += 1
+                    self.unregister(transfer)
+                    try:
+                        transfer.abort()
+                    except OSError:
+                        pass
+
+    def _too_slow(self, transfer: Transfer, now: float) -> bool:
+        """Record a sample; True once a full window has passed below `min_rate`."""
+        samples = transfer.samples
+        if transfer.paused:
+            samples.clear()
+        samples.append((now, transfer.received))
+        # Keep the newest sample at least a window old as the baseline.
+        while len(samples) > 1 and samples[1][0] <= now - self.window:
+            samples.popleft()
+        since, received = samples[0]
+        return (
+            now - since >= self.window
+            and transfer.received - received < self.min_rate * self.window
+        )
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from image_store import ImageStore
+from transfer import file_digest
+
+
+IMAGE_DB_PATH = Path("cache/images.db")
+ASSETS_DIR = Path("assets")
+
+
+def check_file(path: Path, sha256: str, size: int, quick: bool = False) -> str | None:
+    """Return a description of what is wrong with `path`, or None if it matches."""
+    try:
+        actual_size = path.stat().st_size
+    except FileNotFoundError:
+        return "missing"
+    if actual_size != size:
+        return f"size {actual_size} != {size}"
+    if not quick and file_digest(path).hexdigest() != sha256:
+        return "sha256 mismatch"
+    return None
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Re-hash assets against their recorded SHA-256.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of hashing processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--quick", action="store_true", help="only compare file sizes, skip hashing"
+    )
+    args = parser.parse_args(argv)
+
+    if not IMAGE_DB_PATH.exists():
+        raise FileNotFoundError(f"Image store not found: {IMAGE_DB_PATH}")
+    with ImageStore(IMAGE_DB_PATH) as store:
+        records = list(store.integrity())
+
+    names = [name for name, _, _ in records]
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        problems = list(
+            pool.map(
+                check_file,
+                [ASSETS_DIR / name for name in names],
+                [sha256 for _, sha256, _ in records],
+                [size for _, _, size in records],
+                [args.quick] * len(names),
+                chunksize=32,
+            )
+        )
+
+    corrupt = 0
+    for name, problem in zip(names, problems):
+        if problem:
+            corrupt += 1
+            print(f"Corrupt {name}: {problem}")
+
+    print(f"Verified {len(names)} files, {corrupt} corrupt")
+    if corrupt:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
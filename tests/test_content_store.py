@@ -0,0 +1,86 @@
+"""Adopting downloads into the content store, including a store on another filesystem."""
+
+from __future__ import annotations
+
+import argparse
+import errno
+import os
+import sys
+from collections import Counter
+from concurrent.futures import Future
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import content_store  # noqa: E402
+import get_image  # noqa: E402
+from content_store import adopt, object_path  # noqa: E402
+from get_image import PlanAction, fetch_all  # noqa: E402
+from image_store import ImageStore  # noqa: E402
+
+
+DIGEST = "ab" * 32
+
+
+def cross_device(monkeypatch: pytest.MonkeyPatch, downloads: Path) -> None:
+    """Make renames and hardlinks out of `downloads` fail as they do across filesystems."""
+    replace = Path.replace
+
+    def fake_replace(self: Path, target: Path) -> Path:
+        if self.parent == downloads:
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        return replace(self, target)
+
+    def fake_link(source: Path, target: Path) -> None:
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(Path, "replace", fake_replace)
+    monkeypatch.setattr(content_store.os, "link", fake_link)
+
+
+def test_adopt_across_filesystems(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    downloads = tmp_path / "assets"
+    downloads.mkdir()
+    path = downloads / "a.png"
+    path.write_bytes(b"image")
+    cross_device(monkeypatch, downloads)
+
+    assert not adopt(path, DIGEST, "hardlink", tmp_path / "store")
+
+    blob = object_path(DIGEST, ".png", tmp_path / "store")
+    assert blob.read_bytes() == b"image"
+    assert path.is_symlink() and path.resolve() == blob.resolve()
+    assert os.listdir(blob.parent) == [blob.name]
+
+
+class DoneDownloader:
+    """Completes every download at once with the given result."""
+
+    def __init__(self, result: dict[str, object]) -> None:
+        self.result = result
+
+    def submit(self, url: str, path: Path, **kwargs: object) -> Future:
+        future: Future = Future()
+        future.set_result(dict(self.result))
+        return future
+
+
+def test_failed_adopt_fails_only_that_file(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def broken_adopt(path: Path, sha256: str, mode: str) -> bool:
+        raise OSError(errno.EPERM, "Operation not permitted")
+
+    monkeypatch.setattr(get_image, "adopt", broken_adopt)
+    monkeypatch.setattr(get_image, "ASSETS_DIR", tmp_path)
+    stats: Counter[str] = Counter()
+    actions = [
+        PlanAction("download", f"https://i/{name}", name, name) for name in ("a.png", "b.png")
+    ]
+    args = argparse.Namespace(content_store="symlink")
+    with ImageStore(tmp_path / "images.db") as store:
+        fetch_all(actions, store, DoneDownloader({"sha256": DIGEST, "size": 5}), args, stats)
+        assert len(store) == 0
+    assert stats["downloaded"] == 0
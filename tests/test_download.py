@@ -0,0 +1,133 @@
+"""Both download backends against a local server with ranges, validators and failures."""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import sys
+import threading
+from collections.abc import Callable, Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from get_image import ThreadedDownloader  # noqa: E402
+from throttle import HostThrottle, RetryPolicy  # noqa: E402
+from transfer import start_partial  # noqa: E402
+
+
+BODY = bytes(range(256)) * 400
+ETAG = '"v1"'
+SHA256 = hashlib.sha256(BODY).hexdigest()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests: list[tuple[str, str]] = []
+    failures: dict[str, int] = {}
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self.requests.append((self.path, self.headers.get("Range", "")))
+        if self.failures.get(self.path, 0) > 0:
+            self.failures[self.path] -= 1
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        start, end, status = 0, len(BODY) - 1, 200
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match and self.headers.get("If-Range", ETAG) == ETAG:
+            start, status = int(match[1]), 206
+            end = int(match[2]) if match[2] else end
+        self.send_response(status)
+        self.send_header("ETag", ETAG)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(BODY)}")
+        self.end_headers()
+        self.wfile.write(BODY[start : end + 1])
+
+
+@pytest.fixture(scope="module")
+def server() -> Iterator[str]:
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def reset_server() -> None:
+    Handler.requests.clear()
+    Handler.failures.clear()
+
+
+def threaded(segments: int) -> ThreadedDownloader:
+    throttle = HostThrottle(policy=RetryPolicy(base=0.01, cap=0.01))
+    return ThreadedDownloader(2, segments, segment_threshold=1024, throttle=throttle)
+
+
+def async_backend(segments: int) -> Any:
+    pytest.importorskip("aiohttp")
+    from download_async import AsyncDownloader
+
+    throttle = HostThrottle(policy=RetryPolicy(base=0.01, cap=0.01))
+    return AsyncDownloader(2, segments=segments, segment_threshold=1024, throttle=throttle)
+
+
+@pytest.fixture(params=[threaded, async_backend], ids=["threads", "aiohttp"])
+def backend(request: pytest.FixtureRequest) -> Callable[[int], Any]:
+    return request.param
+
+
+def fetch(make: Callable[[int], Any], url: str, path: Path, segments: int = 1, **kwargs: Any):
+    with make(segments) as downloader:
+        return downloader.submit(url, path, **kwargs).result()
+
+
+@pytest.mark.parametrize("segments", [1, 4])
+def test_download(backend, server: str, tmp_path: Path, segments: int) -> None:
+    path = tmp_path / "a.bin"
+    result = fetch(backend, f"{server}/a.bin", path, segments)
+    assert path.read_bytes() == BODY
+    assert (result["sha256"], result["size"], result["etag"]) == (SHA256, len(BODY), ETAG)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.bin"]
+    assert len(Handler.requests) == segments
+
+
+def test_resume_partial(backend, server: str, tmp_path: Path) -> None:
+    path = tmp_path / "a.bin"
+    temp_path = tmp_path / "a.bin.part"
+    temp_path.write_bytes(BODY[:5000])
+    start_partial(temp_path, {"etag": ETAG, "content_length": str(len(BODY))})
+    result = fetch(backend, f"{server}/a.bin", path)
+    assert path.read_bytes() == BODY
+    assert result["sha256"] == SHA256
+    assert Handler.requests == [("/a.bin", "bytes=5000-")]
+
+
+def test_not_modified(backend, server: str, tmp_path: Path) -> None:
+    path = tmp_path / "a.bin"
+    assert fetch(backend, f"{server}/a.bin", path, validators={"etag": ETAG}) is None
+    assert not path.exists()
+
+
+def test_retry_after_error(backend, server: str, tmp_path: Path) -> None:
+    Handler.failures["/a.bin"] = 1
+    path = tmp_path / "a.bin"
+    assert fetch(backend, f"{server}/a.bin", path)["sha256"] == SHA256
+    assert len(Handler.requests) == 2
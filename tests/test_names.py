@@ -0,0 +1,101 @@
+"""NameAllocator against the baseline's full scan over several runs of a sync."""
+
+from __future__ import annotations
+
+import random
+import sys
+from collections import Counter
+from collections.abc import Mapping
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import get_image  # noqa: E402
+from get_image import (  # noqa: E402
+    NameAllocator,
+    PlannedCache,
+    apply_local,
+    iter_plan,
+    scan_assets,
+)
+from image_store import ImageStore  # noqa: E402
+from poster import Poster  # noqa: E402
+
+
+def choose_filename(
+    base: str, ext: str, url: str, image_cache: Mapping[str, str], reserved: set[str]
+) -> str:
+    """The baseline get_image's linear scan, kept as the reference."""
+    candidate = f"{base}{ext}"
+    counter = 2
+
+    while True:
+        conflict_cache = candidate in image_cache and image_cache[candidate] != url
+        conflict_reserved = candidate in reserved and candidate not in image_cache
+
+        if conflict_cache or conflict_reserved:
+            candidate = f"{base}_{counter}{ext}"
+            counter += 1
+            continue
+
+        return candidate
+
+
+class CheckedAllocator(NameAllocator):
+    """Checks every name chosen against the full scan over the same view."""
+
+    def choose(self, base: str, ext: str, url: str) -> str:
+        expected = choose_filename(base, ext, url, self.view, self.reserved)
+        name = super().choose(base, ext, url)
+        assert name == expected, (base, ext, url)
+        self.checked += 1
+        return name
+
+    checked = 0
+
+
+def random_posters(rng: random.Random) -> list[Poster]:
+    # Few titles and URLs, so names collide and URLs move between posters.
+    posters = []
+    for _ in range(rng.randint(5, 40)):
+        urls = [f"https://i/{rng.randrange(30)}.png" for _ in range(rng.choice([1, 1, 2]))]
+        posters.append(Poster(rng.choice(["A", "B", "C_2", "C", "D"]), "", "", urls))
+    return posters
+
+
+def sync(store: ImageStore, assets: Path, posters: list[Poster], rng: random.Random) -> int:
+    """One run; about one fetch in five fails and is left unrecorded."""
+    names = CheckedAllocator(store, PlannedCache(store))
+    stats: Counter[str] = Counter()
+    plan = iter_plan(posters, store, names, scan_assets(assets))
+    for action in apply_local(plan, store, names, stats):
+        if rng.random() < 0.2:
+            continue
+        (assets / action.filename).write_bytes(action.url.encode())
+        store.put(action.filename, action.url)
+    names.save()
+    return names.checked
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_names_match_full_scan(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, seed: int):
+    rng = random.Random(seed)
+    assets = tmp_path / "assets"
+    assets.mkdir()
+    monkeypatch.setattr(get_image, "ASSETS_DIR", assets)
+    checked = 0
+    with ImageStore(tmp_path / "images.db") as store:
+        posters = random_posters(rng)
+        for _ in range(6):
+            checked += sync(store, assets, posters, rng)
+            for path in sorted(assets.iterdir()):
+                if rng.random() < 0.15:
+                    path.unlink()
+            rng.shuffle(posters)
+            posters = posters[: rng.randint(len(posters) // 2, len(posters))]
+            posters += random_posters(rng)[:5]
+            for path in assets.iterdir():
+                assert store.get(path.name) == path.read_bytes().decode()
+    assert checked > 50
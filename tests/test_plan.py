@@ -0,0 +1,68 @@
+"""iter_plan naming across runs, applied to a store and an assets directory on disk."""
+
+from __future__ import annotations
+
+import sys
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import get_image  # noqa: E402
+from get_image import (  # noqa: E402
+    NameAllocator,
+    PlannedCache,
+    apply_local,
+    iter_plan,
+    scan_assets,
+)
+from image_store import ImageStore  # noqa: E402
+from poster import Poster  # noqa: E402
+
+
+SHARED = "https://i/shared.png"
+OTHER = "https://i/other.png"
+
+
+def sync(store: ImageStore, assets: Path, posters: list[Poster], revalidate: bool) -> Counter[str]:
+    """Plan and apply one run; fetches are recorded as if they had succeeded."""
+    stats: Counter[str] = Counter()
+    names = NameAllocator(store, PlannedCache(store))
+    plan = iter_plan(posters, store, names, scan_assets(assets), revalidate=revalidate)
+    for action in apply_local(plan, store, names, stats):
+        (assets / action.filename).write_bytes(action.url.encode())
+        store.put(action.filename, action.url, {"etag": '"v"'})
+        stats[action.kind] += 1
+    names.save()
+    return stats
+
+
+@pytest.fixture
+def store(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> ImageStore:
+    assets = tmp_path / "assets"
+    assets.mkdir()
+    monkeypatch.setattr(get_image, "ASSETS_DIR", assets)
+    store = ImageStore(tmp_path / "images.db")
+    # X.png belongs to another URL, so the shared one was kept as X_1.png.
+    for name, url in (("X.png", OTHER), ("X_1.png", SHARED)):
+        (assets / name).write_bytes(url.encode())
+        store.put(name, url, {"etag": '"v"'})
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize("revalidate", [False, True])
+def test_shared_url_named_by_first_poster(store: ImageStore, revalidate: bool) -> None:
+    assets = get_image.ASSETS_DIR
+    posters = [Poster("新", "", "", [SHARED]), Poster("X", "", "", [SHARED])]
+
+    first = sync(store, assets, posters, revalidate)
+    assert first["renamed"] == 1
+    assert store.filename_for(SHARED) == "新.png"
+
+    second = sync(store, assets, posters, revalidate)
+    assert second["renamed"] == 0
+    assert store.filename_for(SHARED) == "新.png"
+    assert sorted(path.name for path in assets.iterdir()) == ["X.png", "新.png"]
@@ -0,0 +1,160 @@
+"""
+parse_section (scanner with tree fallback) against the mwparserfromhell tree parse.
+
+This is the differential check behind scan_section: fixed cases plus randomly assembled
+pages of plain and adversarial markup must parse exactly as the tree parse does.
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from get_meta import (  # noqa: E402
+    extract_posters,
+    parse_section,
+    parse_section_tree,
+    scan_section,
+    split_sections,
+)
+
+
+POSTER = "{{微博|[https://weibo.com/1 海报]|描述|https://i/a.png}}"
+
+# Pieces the random pages are built from: well-formed posters, markup the
+# scanner has to hand over to the tree parse, and stray or unclosed markup.
+FRAGMENTS = [
+    POSTER,
+    "{{微博|[https://w/x?a=b c]|d|https://i/b.png|https://i/c.png}}",
+    "{{微博|a|x{{=}}y|https://i/q.png?a{{=}}1}}",
+    "{{微博|[https://w c|d]|e}}",
+    "{{微博|a|b|c=d|e}}",
+    "{{微博|a|  |  }}",
+    "{{微博|a|x\n\n\n\ny  z|c}}",
+    "{{微博|a|x&amp;y}}",
+    "{{微博|a|x<br>y|z}}",
+    "{{微博|a\n== h ==\n|b}}",
+    "{{微博|a|*x\n*y}}",
+    "{{微博|a|b\n----\nc}}",
+    "{{微博}}",
+    "{{ 微博 \n|a|b}}",
+    "{{微博|[[链接|文本]]|'''b'''}}",
+    "{{微博|a|{{其他|x}}|c}}",
+    "{{foo|{{微博|n}}}}",
+    "{{微博|<!-- c -->a}}",
+    "{{导航}}",
+    "{{{arg}}}",
+    "{{",
+    "}}",
+    "{{=}}",
+    "|",
+    "[[a|b\n",
+    "]]",
+    "[[Category:x]]",
+    "[http://x ",
+    "'''",
+    "''",
+    "http://x",
+    "<!--",
+    "-->",
+    "<span>",
+    "</span>",
+    "<nowiki>",
+    "</nowiki>",
+    "{|",
+    "|}",
+    "* ",
+    "; a : ",
+    "== 分类 ==",
+    "=== 2020 ===",
+    "==== 小 ====",
+    "== [[x]] ==",
+    "== a == x",
+    "=== a ==",
+    "== a &amp; b ==",
+    "== x {{foo ==",
+    "== x <span> ==",
+    "== x [[a| ==",
+    "文本",
+    " ",
+    "\n",
+    "\n",
+    "\n",
+    "\r\n",
+]
+
+CASES = [
+    # A link whose label runs across lines takes the heading inside it along.
+    "[[a|\n=== y ===\nb]]\n" + POSTER,
+    "[[File:a.png|\n== C ==\n]]" + POSTER,
+    "== C ==\n[[a|x\n=== 2020 ===\n]]\n" + POSTER,
+    # Without a label the newline ends the link attempt and the heading counts.
+    "[[a\n=== y ===\nb]]\n" + POSTER,
+    "== C ==\n=== 2020 ===\n" + POSTER + "\n[[a|b]] " + POSTER,
+    "<div>\n== C ==\n</div>\n" + POSTER,
+    "''\n=== 2020 ===\n" + POSTER,
+    # Heading-like lines the parser does not read as headings.
+    "== A ==\n" + POSTER + "\n== x {{foo ==\n}}\n" + POSTER,
+    "== A ==\n" + POSTER + "\n== x <span> ==\n</span>\n" + POSTER,
+    "== A ==\n" + POSTER + "\n== x <!-- ==\n-->\n" + POSTER,
+    "== A ==\n" + POSTER + "\n== x [[a| ==\n]]\n" + POSTER,
+    "== A ==\n=== 2020 ===\n" + POSTER + "\n== B ==\n" + POSTER + "\n=== 2021 ===\n" + POSTER,
+]
+
+
+def random_page(seed: int) -> str:
+    rng = random.Random(seed)
+    return "".join(
+        rng.choice(FRAGMENTS) + rng.choice(["\n", "\n", "", " "])
+        for _ in range(rng.randint(1, 16))
+    )
+
+
+@pytest.mark.parametrize("wikitext", CASES)
+@pytest.mark.parametrize("context", [(None, None), ("C", "Y")])
+def test_cases_match_tree(wikitext: str, context: tuple[str | None, str | None]) -> None:
+    assert parse_section(wikitext, *context) == parse_section_tree(wikitext, *context)
+
+
+def test_random_pages_match_tree() -> None:
+    scanned = 0
+    for seed in range(500):
+        wikitext = random_page(seed)
+        context = (None, None) if seed % 2 else ("C", "Y")
+        scanned += scan_section(wikitext, *context) is not None
+        assert parse_section(wikitext, *context) == parse_section_tree(
+            wikitext, *context
+        ), f"seed {seed}: {wikitext!r}"
+    # Otherwise the tree parse would just be compared with itself.
+    assert scanned > 50
+
+
+def test_split_pages_match_tree() -> None:
+    for seed in range(500):
+        wikitext = random_page(seed)
+        posters, category, year = [], None, None
+        for section in split_sections(wikitext):
+            found, category, year = parse_section(section, category, year)
+            posters += found
+        assert (posters, category, year) == parse_section_tree(wikitext), f"seed {seed}"
+
+
+@pytest.mark.parametrize("wikitext", CASES)
+def test_cases_extract_like_tree(wikitext: str) -> None:
+    assert extract_posters(wikitext) == parse_section_tree(wikitext)[0]
+
+
+def test_random_pages_extract_like_tree() -> None:
+    for seed in range(500):
+        wikitext = random_page(seed)
+        assert extract_posters(wikitext) == parse_section_tree(wikitext)[0], f"seed {seed}"
+
+
+def test_chapters_in_pool_extract_like_tree() -> None:
+    wikitext = "\n".join(CASES[-5:])
+    assert extract_posters(wikitext, workers=2) == parse_section_tree(wikitext)[0]